@@ -7,16 +7,21 @@ need.
 import contextlib
 from html.parser import HTMLParser
 import io
+import json
 import logging
 import typing as t
 from urllib import parse, request
 
 from .compat import parse_header
+from .jsonutils import unpack_key, unpack_str
 
-__all__ = ["Extractor", "fetch_meta", "fix_attributes"]
+__all__ = ["Extractor", "fetch_meta", "fix_attributes", "pack_meta", "unpack_meta"]
 
 logger = logging.getLogger(__name__)
 
+# Bumped whenever the layout produced by `pack_meta` changes.
+_PACK_VERSION = 1
+
 
 # pylint: disable-msg=R0904
 class Extractor(HTMLParser):
@@ -93,7 +98,7 @@ class Extractor(HTMLParser):
         logger.error("Error in Extractor: %s", message)  # pragma: no cover
 
 
-def _safe_slurp(fh: io.IOBase, chunk_size: int = 65536, encoding: str = "UTF-8") -> t.Iterator[str]:
+def _safe_slurp(fh: io.IOBase | t.IO[bytes], chunk_size: int = 65536, encoding: str = "UTF-8") -> t.Iterator[str]:
     """Safely convert file object, converting it to the given file encoding.
 
     This handles situations such as UTF-8 characters on chunk boundaries
@@ -126,7 +131,7 @@ def _safe_slurp(fh: io.IOBase, chunk_size: int = 65536, encoding: str = "UTF-8")
             # If the error is at the start, there's a genuine issue.
             if exc.start == 0:
                 raise
-            decoded = chunk[: exc.start].decode()
+            decoded = chunk[: exc.start].decode(encoding)
             prelude = chunk[exc.start :]
         yield decoded
 
@@ -197,3 +202,65 @@ def fetch_meta(
             properties = extracted.properties
 
     return links, properties
+
+
+def pack_meta(
+    links: t.Iterable[dict[str, str]],
+    properties: t.Iterable[tuple[str, str]],
+) -> bytes:
+    """Encode the results of [adjunct.discovery.fetch_meta][] compactly for caching.
+
+    Attribute names such as `href`, `rel`, and `type`, and property names such
+    as `og:title`, are stored once in a shared table and referred to by index.
+
+    Args:
+        links: the link tag data
+        properties: the properties discovered in meta tags
+
+    Returns:
+        The encoded links and properties.
+    """
+    keys: dict[str, int] = {}
+    packed_links = []
+    for link in links:
+        record: list[str | int] = []
+        for name, value in link.items():
+            record.append(keys.setdefault(name, len(keys)))
+            record.append(value)
+        packed_links.append(record)
+    packed_properties = [[keys.setdefault(name, len(keys)), value] for name, value in properties]
+    return json.dumps(
+        [_PACK_VERSION, list(keys), packed_links, packed_properties],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def unpack_meta(data: bytes) -> tuple[list[dict[str, str]], list[tuple[str, str]]]:
+    """Decode links and properties encoded with [adjunct.discovery.pack_meta][].
+
+    Args:
+        data: the encoded links and properties
+
+    Returns:
+        The link tag data and the properties discovered in meta tags.
+
+    Raises:
+        ValueError: if the data is malformed or was packed by an incompatible
+            version of this module.
+    """
+    try:
+        version, keys, packed_links, packed_properties = json.loads(data)
+    except (TypeError, ValueError):
+        raise ValueError("Malformed packed metadata") from None
+    if version != _PACK_VERSION:
+        raise ValueError(f"Unsupported packed metadata version: {version!r}")
+    try:
+        links = [
+            {unpack_key(keys, record[i]): unpack_str(record[i + 1]) for i in range(0, len(record), 2)}
+            for record in packed_links
+        ]
+        properties = [(unpack_key(keys, index), unpack_str(value)) for index, value in packed_properties]
+    except (IndexError, KeyError, TypeError, ValueError):
+        raise ValueError("Malformed packed metadata") from None
+    return links, properties
@@ -0,0 +1,275 @@
+"""Atom and RSS feed generation.
+
+Feeds are written from an iterator of entry rows, such as that returned by
+[adjunct.dbhelpers.query][] with a row factory like `sqlite3.Row` that allows
+columns to be looked up by name. Entries are written out as they're read, so
+memory use stays constant however long the feed is.
+
+The following columns are used, with all but `title` and `updated` being
+optional:
+
+- `id`: the entry's unique identifier; defaults to `link`
+- `title`: the entry's title
+- `link`: the URL of the entry
+- `updated`: when the entry was last updated, as an SQLite timestamp
+- `published`: when the entry was first published, as an SQLite timestamp
+- `author`: the name of the entry's author; in RSS feeds, this is written
+  as `dc:creator`, as RSS's own `author` element must be an email address
+- `summary`: a plain text summary of the entry
+- `content`: the entry's content, as HTML
+"""
+
+import dataclasses
+import datetime
+import email.utils
+import hashlib
+import io
+import itertools
+import typing as t
+
+from . import time
+from .xmlutils import XMLBuilder, stream
+
+__all__ = [
+    "Feed",
+    "etag_matches",
+    "stream_atom",
+    "stream_rss",
+    "weak_etag",
+    "write_atom",
+    "write_rss",
+]
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+DC_NS = "http://purl.org/dc/elements/1.1/"
+
+EntryRow = t.Mapping[str, t.Any]
+
+
+@dataclasses.dataclass
+class Feed:
+    """Metadata describing a feed.
+
+    Attributes:
+        title: the feed's title
+        link: the URL of the site the feed is for
+        id: the feed's unique identifier; defaults to `link`
+        description: a description of the feed
+        author: the name of the feed's author
+        updated: when the feed was last updated, as an SQLite timestamp;
+            defaults to when the first entry was updated, or the current
+            time if there are no entries
+    """
+
+    title: str
+    link: str
+    id: str | None = None
+    description: str | None = None
+    author: str | None = None
+    updated: str | None = None
+
+
+def _field(row: EntryRow, name: str) -> t.Any:
+    # `sqlite3.Row` raises IndexError for unknown columns rather than KeyError.
+    try:
+        return row[name]
+    except (KeyError, IndexError):
+        return None
+
+
+def _entry_id(row: EntryRow) -> str:
+    entry_id = _field(row, "id")
+    return str(_field(row, "link") if entry_id is None else entry_id)
+
+
+def _peek_updated(feed: Feed, rows: t.Iterator[EntryRow]) -> tuple[str, t.Iterator[EntryRow]]:
+    """Figure out when the feed was last updated without consuming any rows."""
+    if feed.updated is not None:
+        return feed.updated, rows
+    first = next(rows, None)
+    if first is None:
+        # Atom requires a timestamp even when there are no entries.
+        return datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d %H:%M:%S"), rows
+    return first["updated"], itertools.chain((first,), rows)
+
+
+def _to_rfc2822(dt: str) -> str:
+    return email.utils.format_datetime(time.parse_dt(dt))
+
+
+def _atom_entry(xml: XMLBuilder, row: EntryRow) -> None:
+    with xml.within("entry"):
+        xml.tag("id", _entry_id(row))
+        xml.tag("title", row["title"])
+        if (link := _field(row, "link")) is not None:
+            xml.tag("link", rel="alternate", href=link)
+        xml.tag("updated", time.to_iso_date(row["updated"]))
+        if (published := _field(row, "published")) is not None:
+            xml.tag("published", time.to_iso_date(published))
+        if (author := _field(row, "author")) is not None:
+            with xml.within("author"):
+                xml.tag("name", author)
+        if (summary := _field(row, "summary")) is not None:
+            xml.tag("summary", summary)
+        if (content := _field(row, "content")) is not None:
+            xml.tag("content", content, type="html")
+
+
+def _build_atom(feed: Feed, rows: t.Iterable[EntryRow]) -> t.Callable[[XMLBuilder], t.Iterator[None]]:
+    def build(xml: XMLBuilder) -> t.Iterator[None]:
+        updated, entries = _peek_updated(feed, iter(rows))
+        with xml.within("feed", xmlns=ATOM_NS):
+            xml.tag("id", feed.id or feed.link)
+            xml.tag("title", feed.title)
+            if feed.description is not None:
+                xml.tag("subtitle", feed.description)
+            xml.tag("link", rel="alternate", href=feed.link)
+            xml.tag("updated", time.to_iso_date(updated))
+            if feed.author is not None:
+                with xml.within("author"):
+                    xml.tag("name", feed.author)
+            for row in entries:
+                _atom_entry(xml, row)
+                yield
+
+    return build
+
+
+def _rss_item(xml: XMLBuilder, row: EntryRow) -> None:
+    with xml.within("item"):
+        xml.tag("title", row["title"])
+        if (link := _field(row, "link")) is not None:
+            xml.tag("link", link)
+        if (entry_id := _field(row, "id")) is not None:
+            xml.tag("guid", str(entry_id), isPermaLink="false")
+        xml.tag("pubDate", _to_rfc2822(_field(row, "published") or row["updated"]))
+        if (author := _field(row, "author")) is not None:
+            xml.tag("dc:creator", author)
+        description = _field(row, "content") or _field(row, "summary")
+        if description is not None:
+            xml.tag("description", description)
+
+
+def _build_rss(feed: Feed, rows: t.Iterable[EntryRow]) -> t.Callable[[XMLBuilder], t.Iterator[None]]:
+    def build(xml: XMLBuilder) -> t.Iterator[None]:
+        updated, entries = _peek_updated(feed, iter(rows))
+        with xml.within("rss", version="2.0", **{"xmlns:dc": DC_NS}), xml.within("channel"):
+            xml.tag("title", feed.title)
+            xml.tag("link", feed.link)
+            xml.tag("description", feed.description or "")
+            xml.tag("lastBuildDate", _to_rfc2822(updated))
+            for row in entries:
+                _rss_item(xml, row)
+                yield
+
+    return build
+
+
+def _write(build: t.Callable[[XMLBuilder], t.Iterator[None]], out: t.IO, encoding: str) -> None:
+    xml = XMLBuilder(out, encoding, direct=True)
+    for _ in build(xml):
+        pass
+    xml.close()
+
+
+def write_atom(feed: Feed, rows: t.Iterable[EntryRow], out: t.IO, *, encoding: str = "utf-8") -> None:
+    """Write an Atom feed to a file object.
+
+    Args:
+        feed: the feed's metadata
+        rows: the feed's entries
+        out: a text or binary file object to write the feed to
+        encoding: the encoding to use for the feed
+    """
+    _write(_build_atom(feed, rows), out, encoding)
+
+
+def write_rss(feed: Feed, rows: t.Iterable[EntryRow], out: t.IO, *, encoding: str = "utf-8") -> None:
+    """Write an RSS 2.0 feed to a file object.
+
+    Args:
+        feed: the feed's metadata
+        rows: the feed's entries
+        out: a text or binary file object to write the feed to
+        encoding: the encoding to use for the feed
+    """
+    _write(_build_rss(feed, rows), out, encoding)
+
+
+def stream_atom(feed: Feed, rows: t.Iterable[EntryRow], *, encoding: str = "utf-8") -> t.Iterator[bytes]:
+    """Generate an Atom feed in encoded chunks, such as for a WSGI response.
+
+    Args:
+        feed: the feed's metadata
+        rows: the feed's entries
+        encoding: the encoding to use for the feed
+
+    Returns:
+        An iterator over the encoded feed.
+    """
+    return stream(_build_atom(feed, rows), encoding)
+
+
+def stream_rss(feed: Feed, rows: t.Iterable[EntryRow], *, encoding: str = "utf-8") -> t.Iterator[bytes]:
+    """Generate an RSS 2.0 feed in encoded chunks, such as for a WSGI response.
+
+    Args:
+        feed: the feed's metadata
+        rows: the feed's entries
+        encoding: the encoding to use for the feed
+
+    Returns:
+        An iterator over the encoded feed.
+    """
+    return stream(_build_rss(feed, rows), encoding)
+
+
+def weak_etag(rows: t.Iterable[EntryRow], fields: t.Sequence[str] = ("id", "updated")) -> str:
+    """Compute a weak ETag for a feed from its entries.
+
+    Only the given fields are hashed, so this can be fed from a cheap query
+    that fetches just those columns, letting an unchanged feed be answered
+    with a 304 without it being rendered.
+
+    Args:
+        rows: the feed's entries
+        fields: the fields to take into account
+
+    Returns:
+        A weak ETag, suitable for use in an `ETag` header.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    buf = io.StringIO()
+    for row in rows:
+        for name in fields:
+            value = _field(row, name)
+            buf.write("\x00\x1f" if value is None else f"{value}\x1f")
+        buf.write("\x1e")
+        if buf.tell() >= 65536:
+            digest.update(buf.getvalue().encode())
+            buf.seek(0)
+            buf.truncate()
+    digest.update(buf.getvalue().encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """Check if an ETag matches an `If-None-Match` header.
+
+    As per [RFC 9110], the comparison is weak, so `W/` prefixes are ignored.
+
+    [RFC 9110]: https://www.rfc-editor.org/rfc/rfc9110#name-if-none-match
+
+    Args:
+        etag: the ETag of the current representation
+        if_none_match: the value of the `If-None-Match` header, if any
+
+    Returns:
+        `True` if the client's copy is current and a 304 can be sent.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
@@ -6,6 +6,10 @@ For information on the parameters, see [the SDK](https://docs.gravatar.com/sdk/i
 import hashlib
 from urllib import parse
 
+from .html import Template
+
+_IMG = Template("img", ("src", "width", "height", "alt"))
+
 
 def make_gravatar_img(
     email: str,
@@ -25,7 +29,7 @@ def make_gravatar_img(
         An `<img>` tag with suitable attributes.
     """
     url = make_gravatar(email, size, default, rating)
-    return f'<img src="{url}" width="{size}" height="{size}" alt="">'
+    return _IMG.render(url, str(size), str(size), "")
 
 
 def make_gravatar(
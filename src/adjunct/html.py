@@ -1,20 +1,47 @@
 """HTML parsing and serialisation support."""
 
+import codecs
+import collections
+import contextlib
 import dataclasses
+import functools
 from html import escape
 from html.parser import HTMLParser
 import io
+import itertools
 import logging
+import re
+import sys
 import typing as t
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
     "Element",
+    "EventStream",
+    "LimitExceededError",
+    "Policy",
+    "Rewriter",
+    "Template",
+    "excerpt",
+    "extract_text",
+    "iterparse",
     "make",
     "parse",
+    "parse_file",
+    "parse_stream",
 ]
 
+# A source of markup: a string, a file object, or an iterable of chunks.
+Source = str | bytes | t.IO | t.Iterable[str | bytes]
+
+# Rewrites an attribute given the tag, attribute name, and value; returns the
+# new name and value, or `None` to drop the attribute.
+AttributeFilter = t.Callable[[str, str, str | None], tuple[str, str | None] | None]
+
+# Modifies the attributes of an element in place given the tag.
+ElementFilter = t.Callable[[str, dict[str, str | None]], None]
+
 # See: https://html.spec.whatwg.org/multipage/syntax.html#void-elements
 _SELF_CLOSING = {
     "area",
@@ -35,12 +62,130 @@ _SELF_CLOSING = {
     "wbr",
 }
 
+# Shared by every element without attributes.
+_NO_ATTRS: tuple[tuple[str, str | None], ...] = ()
+
+# Approximate number of characters to buffer between writes when serialising.
+_CHUNK_SIZE = 65536
+
+
+# Only ASCII whitespace is collapsible in HTML, so not `\s`, which would
+# also match non-breaking spaces.
+_WHITESPACE = re.compile(r"[ \t\n\f\r]+")
+
+# Attribute values matching this can be left unquoted.
+_UNQUOTED = re.compile(r"[^\s\"'=<>`]+")
+
+# Elements within which whitespace is significant when minifying.
+_PRESERVE_WHITESPACE = frozenset({"pre", "script", "style", "textarea"})
+
+# Elements that can't directly contain text, so whitespace between their
+# children can be dropped when minifying.
+_NO_TEXT = frozenset(
+    {
+        "colgroup",
+        "dl",
+        "head",
+        "html",
+        "ol",
+        "optgroup",
+        "select",
+        "table",
+        "tbody",
+        "tfoot",
+        "thead",
+        "tr",
+        "ul",
+    }
+)
+
+# See: https://html.spec.whatwg.org/multipage/syntax.html#optional-tags
+# Maps elements whose end tags can be omitted to the elements that can
+# immediately follow them for that to happen; `None` stands for the end of
+# the parent element.
+_P_FOLLOWERS = frozenset(
+    {
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "details",
+        "dialog",
+        "div",
+        "dl",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "header",
+        "hgroup",
+        "hr",
+        "main",
+        "menu",
+        "nav",
+        "ol",
+        "p",
+        "pre",
+        "search",
+        "section",
+        "table",
+        "ul",
+        None,
+    }
+)
+_OPTIONAL_END: dict[str, frozenset[str | None]] = {
+    "body": frozenset({None}),
+    "dd": frozenset({"dd", "dt", None}),
+    "dt": frozenset({"dd", "dt"}),
+    "html": frozenset({None}),
+    "li": frozenset({"li", None}),
+    "optgroup": frozenset({"optgroup", None}),
+    "option": frozenset({"optgroup", "option", None}),
+    "p": _P_FOLLOWERS,
+    "rp": frozenset({"rp", "rt", None}),
+    "rt": frozenset({"rp", "rt", None}),
+    "tbody": frozenset({"tbody", "tfoot", None}),
+    "td": frozenset({"td", "th", None}),
+    "tfoot": frozenset({None}),
+    "th": frozenset({"td", "th", None}),
+    "thead": frozenset({"tbody", "tfoot"}),
+    "tr": frozenset({"tr", None}),
+}
+
+# A `p` element's end tag can't be omitted at the end of these elements.
+_P_KEEP_END_IN = frozenset({"a", "audio", "del", "ins", "map", "noscript", "video"})
+
+
+def _start_tag(tag: str, attrs: t.Iterable[tuple[str, str | None]], *, minify: bool = False) -> str:
+    parts = [f"<{tag}"]
+    for name, value in attrs:
+        if value is None or (minify and value == ""):
+            parts.append(f" {name}")
+        elif minify and _UNQUOTED.fullmatch(value):
+            parts.append(f" {name}={escape(value, quote=False)}")
+        else:
+            parts.append(f' {name}="{escape(value, quote=True)}"')
+    parts.append(">")
+    return "".join(parts)
+
+
+def _end_tag(tag: str | None) -> str:
+    return "" if tag is None or tag in _SELF_CLOSING else f"</{tag}>"
+
 
 def make(
     tag: str,
     attrs: t.Mapping[str, str | None],
     *,
     close: bool | None = None,
+    minify: bool = False,
 ) -> str:
     """Helper for quickly constructing a HTML tag.
 
@@ -49,17 +194,12 @@ def make(
         attrs: attributes to apply to the tag
         close: set to `True` or `False` to determine whether a closing tag
             should be generated; omit to let the function decide
+        minify: leave attribute values unquoted where that's safe
 
     Returns:
         the tag
     """
-    attr_list = []
-    for name, value in attrs.items():
-        if value is None:
-            attr_list.append(f" {name}")
-        else:
-            attr_list.append(f' {name}="{escape(value, quote=True)}"')
-    result = f"<{tag}{''.join(attr_list)}>"
+    result = _start_tag(tag, attrs.items(), minify=minify)
     if close is None:
         close = tag not in _SELF_CLOSING
     if close:
@@ -67,19 +207,225 @@ def make(
     return result
 
 
-@dataclasses.dataclass
+def _percent_escape(s: str) -> str:
+    return s.replace("%", "%%")
+
+
+class Template:
+    """A tag with a fixed set of attributes, precompiled for fast rendering.
+
+    This produces the same markup as [adjunct.html.make][], but everything
+    except escaping the attribute values is done once up front, which makes
+    a difference when rendering the same kind of tag many times.
+
+    Examples:
+        >>> img = Template("img", ("src", "alt"))
+        >>> img.render("/a.png", "A & B")
+        '<img src="/a.png" alt="A &amp; B">'
+        >>> img.render_many([("/b.png", "B"), ("/c.png", None)], sep="\\n")
+        '<img src="/b.png" alt="B">\\n<img src="/c.png" alt>'
+
+    Args:
+        tag: tag name
+        names: the names of the attributes, in the order their values will be
+            given when rendering
+        close: set to `True` or `False` to determine whether a closing tag
+            should be generated; omit to let the class decide
+    """
+
+    __slots__ = ("_close", "_format", "_names", "_tag")
+
+    def __init__(self, tag: str, names: t.Sequence[str], *, close: bool | None = None) -> None:
+        if close is None:
+            close = tag not in _SELF_CLOSING
+        self._tag = tag
+        self._names = tuple(names)
+        self._close = f"</{tag}>" if close else ""
+        # Used when no values are `None`, which is the common case.
+        attrs = "".join(f' {_percent_escape(name)}="%s"' for name in self._names)
+        self._format = f"<{_percent_escape(tag)}{attrs}>{_percent_escape(self._close)}"
+
+    def render(self, *values: str | None) -> str:
+        """Render the tag.
+
+        Args:
+            values: the attribute values, in the same order as the names given
+                to the constructor; `None` gives an attribute with no value
+
+        Returns:
+            The tag.
+        """
+        if None in values:
+            return self._render_slow(values)
+        return self._format % tuple(escape(value, quote=True) for value in values)  # type: ignore[arg-type]
+
+    def render_many(self, rows: t.Iterable[t.Sequence[str | None]], sep: str = "") -> str:
+        """Render the tag once for each of a batch of sets of attribute values.
+
+        Args:
+            rows: the attribute values for each tag, as with [adjunct.html.Template.render][]
+            sep: the separator to put between each tag
+
+        Returns:
+            The tags.
+        """
+        fmt = self._format
+        return sep.join(
+            [
+                self._render_slow(row) if None in row else fmt % tuple(escape(value, quote=True) for value in row)  # type: ignore[arg-type]
+                for row in rows
+            ]
+        )
+
+    def _render_slow(self, values: t.Sequence[str | None]) -> str:
+        return _start_tag(self._tag, zip(self._names, values, strict=True)) + self._close
+
+
 class Element:
     """A HTML element.
 
+    Elements are slotted, and their attributes are held as an immutable tuple
+    of pairs until something asks for the `attrs` dictionary, so large parsed
+    trees stay compact. Tag and attribute names are interned.
+
+    Args:
+        tag: the tag name
+        attrs: the tag's attributes, either as a mapping or a sequence of
+            name-value pairs
+        children: the child elements of the element
+
     Attributes:
         tag: the tag name
-        attrs: the tag's attributes
         children: the child elements of the element
     """
 
-    tag: str | None
-    attrs: dict = dataclasses.field(default_factory=dict)
-    children: list = dataclasses.field(default_factory=list)
+    __slots__ = ("_attrs", "children", "tag")
+
+    def __init__(
+        self,
+        tag: str | None,
+        attrs: t.Mapping[str, str | None] | t.Iterable[tuple[str, str | None]] | None = None,
+        children: list | None = None,
+    ) -> None:
+        self.tag = None if tag is None else sys.intern(tag)
+        if not attrs:
+            self._attrs: dict[str, str | None] | tuple[tuple[str, str | None], ...] = _NO_ATTRS
+        elif isinstance(attrs, dict):
+            self._attrs = attrs
+        elif isinstance(attrs, t.Mapping):
+            self._attrs = dict(attrs)
+        else:
+            # Going via a dict means later duplicates win, as they would with `attrs`.
+            self._attrs = tuple({sys.intern(name): value for name, value in attrs}.items())
+        self.children: list = [] if children is None else children
+
+    @property
+    def attrs(self) -> dict[str, str | None]:
+        """The tag's attributes.
+
+        Accessing this converts the element's compact attribute storage into a
+        dictionary that can be freely modified.
+        """
+        if isinstance(self._attrs, tuple):
+            self._attrs = dict(self._attrs)
+        return self._attrs
+
+    @attrs.setter
+    def attrs(self, attrs: dict[str, str | None]) -> None:
+        self._attrs = attrs
+
+    def get(self, name: str, default: str | None = None) -> str | None:
+        """Get the value of an attribute without materialising `attrs`.
+
+        Args:
+            name: the attribute name
+            default: the value to return if the attribute is absent
+
+        Returns:
+            The attribute's value.
+        """
+        if isinstance(self._attrs, dict):
+            return self._attrs.get(name, default)
+        for key, value in self._attrs:
+            if key == name:
+                return value
+        return default
+
+    def _iter_attrs(self) -> t.Iterable[tuple[str, str | None]]:
+        return self._attrs.items() if isinstance(self._attrs, dict) else self._attrs
+
+    def descendants(self, tag: str | None = None) -> t.Iterator["Element"]:
+        """Iterate over the elements nested within this one in document order.
+
+        Args:
+            tag: if given, only yield elements with this tag name
+
+        Yields:
+            The matching elements.
+        """
+        for elem, _ in _walk(self):
+            if tag is None or elem.tag == tag:
+                yield elem
+
+    def select(self, selector: str) -> t.Iterator["Element"]:
+        """Find the elements nested within this one matching a CSS selector.
+
+        A subset of CSS is supported: type selectors (including `*`), `#id`,
+        `.class`, attribute presence (`[attr]`) and equality (`[attr=value]`)
+        selectors, and the descendant and child (`>`) combinators.
+
+        On the root element returned by [adjunct.html.parse][] and friends,
+        candidates are found using indexes of the elements by tag, id, and
+        class, which are built the first time this method is called and
+        reused thereafter. They aren't updated if the tree is modified, so
+        call [adjunct.html.Element.reset_index][] after doing so. On any
+        other element, its descendants are walked lazily instead.
+
+        Args:
+            selector: the CSS selector to match
+
+        Yields:
+            The matching elements in document order.
+
+        Raises:
+            ValueError: if the selector is invalid or unsupported.
+        """
+        compounds, combinators = _compile_selector(selector)
+        return self._select(compounds, combinators)
+
+    def _select(self, compounds: tuple["_Compound", ...], combinators: tuple[str, ...]) -> t.Iterator["Element"]:
+        subject = compounds[-1]
+        last = len(compounds) - 1
+        # The ancestors of the element being looked at, nearest last.
+        ancestors = [self]
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, Element):
+                    if subject.matches(child) and _matches_ancestry(
+                        ancestors, len(ancestors), compounds, combinators, last
+                    ):
+                        yield child
+                    ancestors.append(child)
+                    stack.append(iter(child.children))
+                    break
+            else:
+                stack.pop()
+                ancestors.pop()
+
+    def select_one(self, selector: str) -> "Element | None":
+        """Find the first element nested within this one matching a CSS selector.
+
+        Args:
+            selector: the CSS selector to match, as with [adjunct.html.Element.select][]
+
+        Returns:
+            The first matching element, or `None` if there are none.
+        """
+        return next(self.select(selector), None)
+
+    def reset_index(self) -> None:
+        """Discard any indexes cached by [adjunct.html.Element.select][]."""
 
     def __getitem__(self, i: int):
         return self.children[i]
@@ -90,34 +436,387 @@ class Element:
     def __iter__(self):
         return iter(self.children)
 
-    def serialize(self, dest: t.TextIO | None = None) -> t.TextIO:
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Element):
+            return NotImplemented
+        return (
+            self.tag == other.tag
+            and dict(self._iter_attrs()) == dict(other._iter_attrs())
+            and self.children == other.children
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Element(tag={self.tag!r}, attrs={dict(self._iter_attrs())!r}, children={self.children!r})"
+
+    def serialize(
+        self,
+        dest: t.IO | None = None,
+        *,
+        encoding: str | None = None,
+        chunk_size: int = _CHUNK_SIZE,
+        minify: bool = False,
+    ) -> t.IO:
         """Serialise the element to a file-like object.
 
+        The tree is walked iteratively, so deeply nested documents won't hit
+        the recursion limit, and output is written in chunks of roughly
+        `chunk_size` characters rather than piecemeal.
+
         Args:
             dest: the file-like object to serialise the document to; if this is
-                `None`, as [io.StringIO][] object will be created instead.
+                `None`, as [io.StringIO][] object will be created instead, or
+                an [io.BytesIO][] object if an encoding is given.
+            encoding: if given, `dest` is treated as a binary file and the
+                output is encoded with it; characters the encoding can't
+                represent are written as character references
+            chunk_size: the approximate number of characters to buffer between
+                writes
+            minify: produce minified output, as described in
+                [adjunct.html.Element.iter_serialized][]
 
         Returns:
             A file-like object containing the serialised element.
         """
-        if dest is None:
-            dest = io.StringIO()
+        chunks = self.iter_serialized(chunk_size, minify=minify)
+        if encoding is None:
+            text_dest: t.IO[str] = io.StringIO() if dest is None else dest
+            for chunk in chunks:
+                text_dest.write(chunk)
+            return text_dest
+        binary_dest: t.IO[bytes] = io.BytesIO() if dest is None else dest
+        for chunk in chunks:
+            binary_dest.write(chunk.encode(encoding, "xmlcharrefreplace"))
+        return binary_dest
+
+    def iter_serialized(self, chunk_size: int = _CHUNK_SIZE, *, minify: bool = False) -> t.Iterator[str]:
+        """Serialise the element, yielding the markup in chunks.
+
+        When minifying, runs of whitespace are collapsed outside of `pre`,
+        `textarea`, `script`, and `style` elements, and dropped entirely
+        between the children of elements that can't contain text, such as
+        `ul` and `table`; attribute values are left unquoted where that's
+        safe; and end tags that HTML allows to be omitted are. Browsers will
+        render the result identically, but as [adjunct.html.parse][] doesn't
+        infer omitted end tags, it won't necessarily reproduce the same tree.
+
+        Args:
+            chunk_size: the approximate number of characters in each chunk
+            minify: produce minified output
+
+        Yields:
+            Chunks of serialised markup.
+        """
+        if minify:
+            yield from self._iter_minified(chunk_size)
+            return
+        parts = []
+        size = 0
         if self.tag is not None:
-            dest.write(f"<{self.tag}")
-            for key, value in self.attrs.items():
-                dest.write(f" {key}")
-                if value is not None:
-                    dest.write('="' + escape(value, quote=True) + '"')
-            dest.write(">")
-        for child in self.children:
+            parts.append(_start_tag(self.tag, self._iter_attrs()))
+        # Each frame holds the children of an element still to be written and
+        # the end tag to write once they're exhausted.
+        stack = [(iter(self.children), _end_tag(self.tag))]
+        while stack:
+            children, end = stack[-1]
+            for child in children:
+                if isinstance(child, str):
+                    piece = escape(child, quote=False)
+                elif isinstance(child, Element):
+                    if child.tag is not None:
+                        piece = _start_tag(child.tag, child._iter_attrs())
+                        parts.append(piece)
+                        size += len(piece)
+                    stack.append((iter(child.children), _end_tag(child.tag)))
+                    break
+                else:
+                    continue
+                parts.append(piece)
+                size += len(piece)
+            else:
+                stack.pop()
+                parts.append(end)
+                size += len(end)
+            if size >= chunk_size:
+                yield "".join(parts)
+                parts.clear()
+                size = 0
+        if parts:
+            yield "".join(parts)
+
+    def _iter_minified(self, chunk_size: int) -> t.Iterator[str]:
+        parts = []
+        size = 0
+        for piece in self._iter_minified_pieces():
+            parts.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield "".join(parts)
+                parts.clear()
+                size = 0
+        if parts:
+            yield "".join(parts)
+
+    def _iter_minified_pieces(self) -> t.Iterator[str]:
+        if self.tag is not None:
+            yield _start_tag(self.tag, self._iter_attrs(), minify=True)
+        # Each frame holds an element and the index of its next child to write;
+        # unlike in iter_serialized, we need to be able to look ahead at the
+        # following sibling to decide whether an end tag can be omitted.
+        stack: list[tuple[Element, int]] = [(self, 0)]
+        preserving = int(self.tag in _PRESERVE_WHITESPACE)
+        while stack:
+            elem, i = stack[-1]
+            if i == len(elem.children):
+                stack.pop()
+                if elem.tag in _PRESERVE_WHITESPACE:
+                    preserving -= 1
+                if elem.tag is not None and not (stack and _can_omit_end(elem.tag, *stack[-1])):
+                    yield _end_tag(elem.tag)
+                continue
+            stack[-1] = (elem, i + 1)
+            child = elem.children[i]
             if isinstance(child, str):
-                dest.write(escape(child, quote=False))
+                yield _minify_text(child, elem.tag, preserve=preserving > 0)
             elif isinstance(child, Element):
-                child.serialize(dest)
-        if self.tag is not None and self.tag not in _SELF_CLOSING:
-            dest.write(f"</{self.tag}>")
+                if child.tag is not None:
+                    yield _start_tag(child.tag, child._iter_attrs(), minify=True)
+                stack.append((child, 0))
+                if child.tag in _PRESERVE_WHITESPACE:
+                    preserving += 1
 
-        return dest
+
+def _minify_text(text: str, parent: str | None, *, preserve: bool) -> str:
+    """Escape a text node, collapsing its whitespace unless it's to be preserved."""
+    if not preserve:
+        if parent in _NO_TEXT and _WHITESPACE.fullmatch(text):
+            return ""
+        text = _WHITESPACE.sub(" ", text)
+    return escape(text, quote=False)
+
+
+def _can_omit_end(tag: str, parent: Element, i: int) -> bool:
+    """Can the end tag of the child of `parent` preceding `parent.children[i]` be omitted?"""
+    followers = _OPTIONAL_END.get(tag)
+    if followers is None:
+        return False
+    following = None
+    for sibling in itertools.islice(parent.children, i, None):
+        if isinstance(sibling, Element):
+            following = sibling
+            break
+        # Whitespace is dropped here when minifying, so doesn't count.
+        if isinstance(sibling, str) and sibling and not (parent.tag in _NO_TEXT and _WHITESPACE.fullmatch(sibling)):
+            return False
+    if following is not None:
+        return following.tag in followers
+    if tag == "p" and parent.tag is not None and (parent.tag in _P_KEEP_END_IN or "-" in parent.tag):
+        return False
+    return None in followers
+
+
+def _walk(root: Element) -> t.Iterator[tuple[Element, Element]]:
+    """Walk the elements beneath `root` in document order, with their parents."""
+    stack = [(root, iter(root.children))]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            if isinstance(child, Element):
+                yield child, parent
+                stack.append((child, iter(child.children)))
+                break
+        else:
+            stack.pop()
+
+
+class _Compound(t.NamedTuple):
+    """A compound selector, such as `a.external[href]`."""
+
+    tag: str | None
+    id_: str | None
+    classes: tuple[str, ...]
+    attrs: tuple[tuple[str, str | None], ...]
+
+    def matches(self, elem: Element) -> bool:
+        if elem.tag is None or (self.tag is not None and elem.tag != self.tag):
+            return False
+        if self.id_ is not None and elem.get("id") != self.id_:
+            return False
+        if self.classes:
+            classes = (elem.get("class") or "").split()
+            if not all(name in classes for name in self.classes):
+                return False
+        for name, value in self.attrs:
+            actual = elem.get(name, _MISSING)
+            if actual is _MISSING or (value is not None and actual != value):
+                return False
+        return True
+
+
+_MISSING: t.Any = object()
+
+_SELECTOR_TOKEN = re.compile(
+    r"""
+    \s*(?P<child>>)\s*
+    | (?P<descendant>\s+)
+    | (?P<tag>[a-zA-Z][\w-]*|\*)
+    | \#(?P<id>[\w-]+)
+    | \.(?P<class>[\w-]+)
+    | \[\s*(?P<attr>[^\s"'>/=\]]+)\s*
+      (?:=\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[\w-]+))\s*)?\]
+    """,
+    re.VERBOSE,
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_selector(selector: str) -> tuple[tuple[_Compound, ...], tuple[str, ...]]:
+    """Compile a selector into its compound selectors and the combinators between them."""
+    compounds: list[_Compound] = []
+    combinators: list[str] = []
+    parts: dict[str, t.Any] | None = None
+    selector = selector.strip()
+    pos = 0
+    while pos < len(selector):
+        match = _SELECTOR_TOKEN.match(selector, pos)
+        if match is None:
+            raise ValueError(f"Invalid selector: {selector!r}")
+        pos = match.end()
+        if match["child"] is not None or match["descendant"] is not None:
+            if parts is None:
+                raise ValueError(f"Invalid selector: {selector!r}")
+            compounds.append(_Compound(**parts))
+            combinators.append(">" if match["child"] is not None else " ")
+            parts = None
+        elif match["tag"] is not None:
+            # Type selectors can only appear at the start of a compound selector.
+            if parts is not None:
+                raise ValueError(f"Invalid selector: {selector!r}")
+            parts = _new_compound(None if match["tag"] == "*" else match["tag"].lower())
+        else:
+            if parts is None:
+                parts = _new_compound(None)
+            _add_simple_selector(parts, match)
+    if parts is None:
+        raise ValueError(f"Invalid selector: {selector!r}")
+    compounds.append(_Compound(**parts))
+    return tuple(compounds), tuple(combinators)
+
+
+def _new_compound(tag: str | None) -> dict[str, t.Any]:
+    return {"tag": tag, "id_": None, "classes": (), "attrs": ()}
+
+
+def _add_simple_selector(parts: dict[str, t.Any], match: re.Match) -> None:
+    """Add an id, class, or attribute selector to a compound selector being built."""
+    if match["id"] is not None:
+        parts["id_"] = match["id"]
+    elif match["class"] is not None:
+        parts["classes"] += (match["class"],)
+    else:
+        value = next((match[group] for group in ("dq", "sq", "bare") if match[group] is not None), None)
+        parts["attrs"] += ((match["attr"].lower(), value),)
+
+
+class _Index:
+    """Indexes the elements beneath a root element by tag, id, and class."""
+
+    __slots__ = ("by_class", "by_id", "by_tag", "elements", "parents")
+
+    def __init__(self, root: Element) -> None:
+        self.elements: list[Element] = []
+        self.parents: dict[int, Element] = {}
+        self.by_tag: collections.defaultdict[str, list[Element]] = collections.defaultdict(list)
+        self.by_id: collections.defaultdict[str, list[Element]] = collections.defaultdict(list)
+        self.by_class: collections.defaultdict[str, list[Element]] = collections.defaultdict(list)
+        for elem, parent in _walk(root):
+            self.elements.append(elem)
+            self.parents[id(elem)] = parent
+            if elem.tag is not None:
+                self.by_tag[elem.tag].append(elem)
+            if (elem_id := elem.get("id")) is not None:
+                self.by_id[elem_id].append(elem)
+            for name in set((elem.get("class") or "").split()):
+                self.by_class[name].append(elem)
+
+    def select(self, compounds: tuple[_Compound, ...], combinators: tuple[str, ...]) -> t.Iterator[Element]:
+        subject = compounds[-1]
+        if subject.id_ is not None:
+            candidates = self.by_id.get(subject.id_, ())
+        elif subject.classes:
+            candidates = self.by_class.get(subject.classes[0], ())
+        elif subject.tag is not None:
+            candidates = self.by_tag.get(subject.tag, ())
+        else:
+            candidates = self.elements
+        last = len(compounds) - 1
+        for elem in candidates:
+            if subject.matches(elem) and (last == 0 or self._matches_ancestry(elem, compounds, combinators, last)):
+                yield elem
+
+    def _matches_ancestry(
+        self,
+        elem: Element,
+        compounds: tuple[_Compound, ...],
+        combinators: tuple[str, ...],
+        i: int,
+    ) -> bool:
+        ancestors = []
+        parent = self.parents.get(id(elem))
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.parents.get(id(parent))
+        ancestors.reverse()
+        return _matches_ancestry(ancestors, len(ancestors), compounds, combinators, i)
+
+
+def _matches_ancestry(
+    ancestors: t.Sequence[Element],
+    n: int,
+    compounds: tuple[_Compound, ...],
+    combinators: tuple[str, ...],
+    i: int,
+) -> bool:
+    """Check the first `n` ancestors of an element matching `compounds[i]` against the rest of the selector.
+
+    The ancestors are ordered outermost first.
+    """
+    if i == 0:
+        return True
+    compound = compounds[i - 1]
+    if combinators[i - 1] == ">":
+        return (
+            n > 0
+            and compound.matches(ancestors[n - 1])
+            and _matches_ancestry(ancestors, n - 1, compounds, combinators, i - 1)
+        )
+    for k in range(n - 1, -1, -1):
+        if compound.matches(ancestors[k]) and _matches_ancestry(ancestors, k, compounds, combinators, i - 1):
+            return True
+    return False
+
+
+class _Document(Element):
+    """The root of a parsed document.
+
+    Only this caches the indexes used by `select()`, so other elements don't
+    pay for a slot to hold them.
+    """
+
+    __slots__ = ("_index",)
+
+    def __init__(self) -> None:
+        super().__init__(tag=None)
+        self._index: _Index | None = None
+
+    def _select(self, compounds: tuple["_Compound", ...], combinators: tuple[str, ...]) -> t.Iterator[Element]:
+        if self._index is None:
+            self._index = _Index(self)
+        return self._index.select(compounds, combinators)
+
+    def reset_index(self) -> None:
+        self._index = None
 
 
 class _Parser(HTMLParser):
@@ -125,33 +824,50 @@ class _Parser(HTMLParser):
 
     def __init__(self) -> None:
         super().__init__()
-        self.root = Element(tag=None)
-        self.stack = [self.root]
+        self.root: Element = _Document()
+        self.stack: list[Element] = [self.root]
+        # Text can arrive in pieces when the document is fed in chunks, so
+        # it's gathered here and joined once the next node is added.
+        self.text: list[str] = []
 
     @property
     def top(self):
         return self.stack[-1]
 
+    def _flush_text(self) -> None:
+        if self.text:
+            self.top.children.append("".join(self.text))
+            self.text.clear()
+
     def handle_starttag(self, tag, attrs) -> None:
-        elem = Element(tag=tag, attrs=dict(attrs))
+        self._flush_text()
+        elem = Element(tag=tag, attrs=attrs)
         self.top.children.append(elem)
         if tag not in _SELF_CLOSING:
             self.stack.append(elem)
 
     def handle_startendtag(self, tag, attrs) -> None:
-        elem = Element(tag=tag, attrs=dict(attrs))
+        self._flush_text()
+        elem = Element(tag=tag, attrs=attrs)
         self.top.children.append(elem)
 
     def handle_endtag(self, tag) -> None:
         if tag not in _SELF_CLOSING:
-            while len(self.stack) > 1:
-                self.stack.pop()
-                if tag == self.top.tag:
+            # Close the innermost open element with this tag, along with any
+            # elements left open within it; stray end tags are ignored.
+            for i in range(len(self.stack) - 1, 0, -1):
+                if self.stack[i].tag == tag:
+                    self._flush_text()
+                    del self.stack[i:]
                     break
 
     def handle_data(self, data) -> None:
         if data != "":
-            self.top.children.append(data)
+            self.text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._flush_text()
 
     def error(self, message: str) -> None:
         # This method is undocumented in HTMLParser, but pylint is moaning
@@ -159,16 +875,778 @@ class _Parser(HTMLParser):
         logger.error("Error in Parser: %s", message)  # pragma: no cover
 
 
-def parse(markup: str) -> Element:
+class LimitExceededError(Exception):
+    """Raised when a document exceeds the limits set by a [Policy][adjunct.html.Policy]."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Policy:
+    """A whitelist of the tags and attributes to keep when parsing a document.
+
+    Disallowed elements are unwrapped, with their content kept, unless they're
+    listed in `drop`, in which case their content is discarded too.
+    Disallowed attributes are discarded. Nothing that's discarded is ever
+    added to the tree.
+
+    Attributes:
+        tags: a mapping of each allowed tag to the attributes allowed on it
+        drop: tags whose content is discarded along with them
+        max_depth: the maximum nesting depth of elements, if any
+        max_nodes: the maximum number of elements and text nodes, if any
+    """
+
+    tags: t.Mapping[str, t.Collection[str]]
+    drop: t.Collection[str] = frozenset({"script", "style", "template"})
+    max_depth: int | None = None
+    max_nodes: int | None = None
+
+
+class _SanitizingParser(_Parser):
+    """Parses a HTML document into an [Element][], enforcing a [Policy][]."""
+
+    def __init__(self, policy: Policy) -> None:
+        super().__init__()
+        self.policy = policy
+        self.nodes = 0
+        # The tag of the element whose content is being dropped, and how deeply
+        # nested within elements with that tag we are.
+        self.dropping: str | None = None
+        self.drop_depth = 0
+
+    def _vet(self, tag: str, attrs: list[tuple[str, str | None]], *, opens: bool) -> list | None:
+        """Filter the attributes of a start tag, or return `None` to skip the element."""
+        if self.dropping is not None:
+            if opens and tag == self.dropping:
+                self.drop_depth += 1
+            return None
+        allowed = self.policy.tags.get(tag)
+        if allowed is None:
+            if opens and tag in self.policy.drop:
+                self.dropping = tag
+                self.drop_depth = 1
+            return None
+        if opens and self.policy.max_depth is not None and len(self.stack) > self.policy.max_depth:
+            raise LimitExceededError(f"Elements nested more than {self.policy.max_depth} deep")
+        self._count()
+        return [(name, value) for name, value in attrs if name in allowed]
+
+    def _count(self) -> None:
+        self.nodes += 1
+        if self.policy.max_nodes is not None and self.nodes > self.policy.max_nodes:
+            raise LimitExceededError(f"More than {self.policy.max_nodes} nodes")
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attrs = self._vet(tag, attrs, opens=tag not in _SELF_CLOSING)
+        if attrs is not None:
+            super().handle_starttag(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        attrs = self._vet(tag, attrs, opens=False)
+        if attrs is not None:
+            super().handle_startendtag(tag, attrs)
+
+    def handle_endtag(self, tag) -> None:
+        if self.dropping is not None:
+            if tag == self.dropping:
+                self.drop_depth -= 1
+                if self.drop_depth == 0:
+                    self.dropping = None
+        elif tag in self.policy.tags:
+            super().handle_endtag(tag)
+
+    def handle_data(self, data) -> None:
+        if self.dropping is None and data != "":
+            self._count()
+            super().handle_data(data)
+
+
+def parse(markup: str, *, policy: Policy | None = None) -> Element:
     """Parse a HTML document, returning its root element.
 
     Args:
         markup: the document to parse
+        policy: if given, only the tags and attributes it allows are kept
+
+    Returns:
+        The root element of the document.
+
+    Raises:
+        LimitExceededError: if the document exceeds the limits set by the policy.
+    """
+    return _parse_chunks((markup,), policy)
+
+
+def parse_file(
+    fh: t.BinaryIO,
+    *,
+    encoding: str = "UTF-8",
+    chunk_size: int = _CHUNK_SIZE,
+    policy: Policy | None = None,
+) -> Element:
+    """Parse a HTML document from a binary file object, returning its root element.
+
+    The file is decoded and parsed a chunk at a time, so the whole of its text
+    is never held in memory at once.
+
+    Args:
+        fh: a file-like object opened in binary mode
+        encoding: the text encoding of the document
+        chunk_size: the approximate number of bytes to read at a time
+        policy: if given, only the tags and attributes it allows are kept
+
+    Returns:
+        The root element of the document.
+
+    Raises:
+        LimitExceededError: if the document exceeds the limits set by the policy.
+    """
+    return _parse_chunks(_iter_chunks(fh, encoding, chunk_size), policy)
+
+
+def parse_stream(
+    chunks: t.Iterable[bytes | str],
+    *,
+    encoding: str = "UTF-8",
+    policy: Policy | None = None,
+) -> Element:
+    """Parse a HTML document given in chunks, returning its root element.
+
+    Args:
+        chunks: the document, as an iterable of bytestrings or strings; the
+            boundaries between them can fall anywhere, even mid-character
+        encoding: the text encoding of the document
+        policy: if given, only the tags and attributes it allows are kept
 
     Returns:
         The root element of the document.
+
+    Raises:
+        LimitExceededError: if the document exceeds the limits set by the policy.
     """
-    parser = _Parser()
-    parser.feed(markup)
+    return _parse_chunks(_iter_chunks(chunks, encoding, _CHUNK_SIZE), policy)
+
+
+def _parse_chunks(chunks: t.Iterable[str], policy: Policy | None) -> Element:
+    parser = _Parser() if policy is None else _SanitizingParser(policy)
+    for chunk in chunks:
+        parser.feed(chunk)
     parser.close()
     return parser.root
+
+
+class _EventParser(HTMLParser):
+    """Turns a HTML document into a sequence of parsing events."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.events: collections.deque[tuple[str, t.Any]] = collections.deque()
+        self.stack: list[Element] = []
+
+    def handle_starttag(self, tag, attrs) -> None:
+        elem = Element(tag=tag, attrs=attrs)
+        self.events.append(("start", elem))
+        if tag in _SELF_CLOSING:
+            self.events.append(("end", elem))
+        else:
+            self.stack.append(elem)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        elem = Element(tag=tag, attrs=attrs)
+        self.events.append(("start", elem))
+        self.events.append(("end", elem))
+
+    def handle_endtag(self, tag) -> None:
+        if tag not in _SELF_CLOSING:
+            # This mirrors _Parser.handle_endtag so the events nest the same
+            # way the elements in a parsed tree do.
+            for i in range(len(self.stack) - 1, -1, -1):
+                if self.stack[i].tag == tag:
+                    self._close_from(i)
+                    break
+
+    def handle_data(self, data) -> None:
+        if data != "":
+            self.events.append(("text", data))
+
+    def close(self) -> None:
+        super().close()
+        self._close_from(0)
+
+    def _close_from(self, i: int) -> None:
+        while len(self.stack) > i:
+            self.events.append(("end", self.stack.pop()))
+
+    def error(self, message: str) -> None:
+        # This method is undocumented in HTMLParser, but pylint is moaning
+        # about it, so...
+        logger.error("Error in EventParser: %s", message)  # pragma: no cover
+
+
+class EventStream:
+    """An iterator over the parsing events of a HTML document.
+
+    Each event is a pair of the event type and its payload:
+
+    - `("start", element)` when an element is opened; the element has its tag
+      and attributes, but no children;
+    - `("text", text)` for character data, which may be split across several
+      consecutive events; and
+    - `("end", element)` when an element is closed, with the same element
+      object as the corresponding `start` event.
+
+    Elements are always closed in the reverse order in which they were
+    opened, and void elements are closed immediately.
+
+    It's recommended you use [adjunct.html.iterparse][] rather than
+    instantiating this class directly.
+
+    Args:
+        chunks: the document text, in chunks
+    """
+
+    def __init__(self, chunks: t.Iterable[str]) -> None:
+        self._chunks: t.Iterator[str] | None = iter(chunks)
+        self._parser = _EventParser()
+        self._events = self._parser.events
+
+    def __iter__(self) -> "EventStream":
+        return self
+
+    def __next__(self) -> tuple[str, t.Any]:
+        while not self._events:
+            if self._chunks is None:
+                raise StopIteration
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._chunks = None
+                self._parser.close()
+            else:
+                self._parser.feed(chunk)
+        return self._events.popleft()
+
+    def materialize(self, elem: Element) -> Element:
+        """Build the subtree of an element whose `start` event was just consumed.
+
+        This consumes all the events up to and including the element's `end`
+        event, appending the element's descendants to it.
+
+        Args:
+            elem: the element from the most recent `start` event
+
+        Returns:
+            The element, with its children filled in.
+        """
+        stack = [elem]
+        text: list[str] = []
+        for event, payload in self:
+            if event == "text":
+                text.append(payload)
+                continue
+            if text:
+                stack[-1].children.append("".join(text))
+                text.clear()
+            if event == "start":
+                stack[-1].children.append(payload)
+                stack.append(payload)
+            else:
+                stack.pop()
+                if not stack:
+                    break
+        return elem
+
+
+def _iter_chunks(source: Source, encoding: str, chunk_size: int) -> t.Iterator[str]:
+    """Normalise a source of markup into a sequence of string chunks."""
+    if isinstance(source, str):
+        for i in range(0, len(source), chunk_size):
+            yield source[i : i + chunk_size]
+        return
+    if isinstance(source, io.TextIOBase):
+        yield from iter(lambda: source.read(chunk_size), "")
+        return
+    chunks: t.Iterable[bytes | str]
+    if isinstance(source, (bytes, bytearray)):
+        chunks = (source[i : i + chunk_size] for i in range(0, len(source), chunk_size))
+    elif hasattr(source, "read"):
+        fh = t.cast("t.IO[bytes]", source)
+        chunks = iter(lambda: fh.read(chunk_size), b"")
+    else:
+        chunks = source
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        yield chunk if isinstance(chunk, str) else decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def iterparse(
+    source: Source,
+    *,
+    encoding: str = "UTF-8",
+    chunk_size: int = _CHUNK_SIZE,
+) -> EventStream:
+    """Incrementally parse a HTML document, without building a tree.
+
+    The document is read and parsed a chunk at a time, so memory use is
+    bounded by the chunk size and the nesting depth of the document rather
+    than its size. Use [adjunct.html.EventStream.materialize][] to build the
+    subtree of any element you're interested in.
+
+    Examples:
+        >>> events = iterparse('<p>See <a href="/x">this</a>!</p>')
+        >>> for event, payload in events:
+        ...     if event == "start" and payload.tag == "a":
+        ...         print(events.materialize(payload).serialize().getvalue())
+        <a href="/x">this</a>
+
+    Args:
+        source: the document to parse; this can be a string, a bytestring, a
+            file object opened in text or binary mode, or an iterable of
+            string or bytestring chunks
+        encoding: the text encoding to assume for binary input
+        chunk_size: the approximate size of each chunk to read from strings
+            and file objects
+
+    Returns:
+        An iterator over the parsing events.
+    """
+    return EventStream(_iter_chunks(source, encoding, chunk_size))
+
+
+class Rewriter:
+    """Rewrites HTML documents in a single streaming pass.
+
+    Filters are registered against attribute names and tags, and are applied
+    to each start tag as it's parsed. Output is written as parsing proceeds,
+    so memory use is bounded regardless of the size of the document.
+
+    Tags are balanced the same way [adjunct.html.parse][] does, and text is
+    escaped as with [adjunct.html.Element.serialize][], so the output is the
+    same as parsing and serialising the filtered document would give, with
+    two exceptions: comments and declarations such as `<!DOCTYPE html>` are
+    kept, and the content of `script` and `style` elements is written as-is.
+
+    Examples:
+        >>> from urllib.parse import urljoin
+        >>> rewriter = Rewriter()
+        >>> rewriter.attribute("href", lambda tag, name, value: (name, urljoin("http://example.com/", value)))
+        >>> rewriter.attribute(None, lambda tag, name, value: None if name.startswith("on") else (name, value))
+        >>> rewriter.element("a", lambda tag, attrs: attrs.setdefault("rel", "nofollow"))
+        >>> print(rewriter.rewrite('<a href="/x" onclick="evil()">x</a>').getvalue())
+        <a href="http://example.com/x" rel="nofollow">x</a>
+    """
+
+    def __init__(self) -> None:
+        self._attribute_filters: dict[str | None, list[AttributeFilter]] = collections.defaultdict(list)
+        self._element_filters: dict[str | None, list[ElementFilter]] = collections.defaultdict(list)
+
+    def attribute(self, name: str | None, fn: AttributeFilter) -> None:
+        """Register a filter for an attribute.
+
+        Attribute filters are run in the order they were registered, before
+        any element filters.
+
+        Args:
+            name: the (lowercase) attribute name, or `None` to apply the
+                filter to every attribute
+            fn: the filter; it's passed the tag, attribute name, and value,
+                and returns the new attribute name and value, or `None` to
+                drop the attribute
+        """
+        self._attribute_filters[name].append(fn)
+
+    def element(self, tag: str | None, fn: ElementFilter) -> None:
+        """Register a filter for an element.
+
+        Args:
+            tag: the (lowercase) tag name, or `None` to apply the filter to
+                every element
+            fn: the filter; it's passed the tag and a dictionary of the
+                element's attributes to modify in place
+        """
+        self._element_filters[tag].append(fn)
+
+    def rewrite(
+        self,
+        source: Source,
+        dest: t.TextIO | None = None,
+        *,
+        encoding: str = "UTF-8",
+        chunk_size: int = _CHUNK_SIZE,
+    ) -> t.TextIO:
+        """Rewrite a HTML document.
+
+        Args:
+            source: the document to rewrite, as with [adjunct.html.iterparse][]
+            dest: the file-like object to write the rewritten document to; if
+                this is `None`, an [io.StringIO][] object will be created
+            encoding: the text encoding to assume for binary input
+            chunk_size: the approximate size of each chunk to read, and the
+                number of characters to buffer between writes
+
+        Returns:
+            The file-like object containing the rewritten document.
+        """
+        if dest is None:
+            dest = io.StringIO()
+        parser = _RewritingParser(self, dest, chunk_size)
+        for chunk in _iter_chunks(source, encoding, chunk_size):
+            parser.feed(chunk)
+        parser.close()
+        return dest
+
+    def _filter(self, tag: str, attrs: list[tuple[str, str | None]]) -> t.Iterable[tuple[str, str | None]]:
+        """Apply the registered filters to the attributes of a start tag."""
+        result = {}
+        for name, value in attrs:
+            attr: tuple[str, str | None] | None = (name, value)
+            for attr_fn in self._attribute_filters.get(name, ()):
+                if attr is None:
+                    break
+                attr = attr_fn(tag, *attr)
+            for attr_fn in self._attribute_filters.get(None, ()):
+                if attr is None:
+                    break
+                attr = attr_fn(tag, *attr)
+            if attr is not None:
+                result[attr[0]] = attr[1]
+        for elem_fn in self._element_filters.get(tag, ()):
+            elem_fn(tag, result)
+        for elem_fn in self._element_filters.get(None, ()):
+            elem_fn(tag, result)
+        return result.items()
+
+
+# Elements whose content HTMLParser passes through without decoding entities.
+_RAW_TEXT = frozenset({"script", "style"})
+
+
+class _RewritingParser(HTMLParser):
+    """Writes out a HTML document as it's parsed, applying a rewriter's filters."""
+
+    def __init__(self, rewriter: Rewriter, dest: t.TextIO, chunk_size: int) -> None:
+        super().__init__()
+        self.rewriter = rewriter
+        self.dest = dest
+        self.chunk_size = chunk_size
+        self.parts: list[str] = []
+        self.size = 0
+        # The tags of the elements currently open, so end tags can be
+        # balanced the same way _Parser does.
+        self.stack: list[str] = []
+
+    def _write(self, piece: str) -> None:
+        self.parts.append(piece)
+        self.size += len(piece)
+        if self.size >= self.chunk_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        self.dest.write("".join(self.parts))
+        self.parts.clear()
+        self.size = 0
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self._write(_start_tag(tag, self.rewriter._filter(tag, attrs)))
+        if tag not in _SELF_CLOSING:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self._write(_start_tag(tag, self.rewriter._filter(tag, attrs)) + _end_tag(tag))
+
+    def handle_endtag(self, tag) -> None:
+        if tag not in _SELF_CLOSING:
+            # Close the innermost open element with this tag, along with any
+            # elements left open within it; stray end tags are dropped.
+            for i in range(len(self.stack) - 1, -1, -1):
+                if self.stack[i] == tag:
+                    self._close_from(i)
+                    break
+
+    def handle_data(self, data) -> None:
+        if data != "":
+            # Escaping the content of raw text elements would change it.
+            self._write(data if self.stack and self.stack[-1] in _RAW_TEXT else escape(data, quote=False))
+
+    def handle_comment(self, data) -> None:
+        self._write(f"<!--{data}-->")
+
+    def handle_decl(self, decl) -> None:
+        self._write(f"<!{decl}>")
+
+    def unknown_decl(self, data) -> None:
+        self._write(f"<![{data}]>")
+
+    def handle_pi(self, data) -> None:
+        self._write(f"<?{data}>")
+
+    def _close_from(self, i: int) -> None:
+        while len(self.stack) > i:
+            self._write(f"</{self.stack.pop()}>")
+
+    def close(self) -> None:
+        super().close()
+        self._close_from(0)
+        self._flush()
+
+    def error(self, message: str) -> None:
+        # This method is undocumented in HTMLParser, but pylint is moaning
+        # about it, so...
+        logger.error("Error in RewritingParser: %s", message)  # pragma: no cover
+
+
+# Elements whose content isn't visible text.
+_INVISIBLE = frozenset({"script", "style", "template"})
+
+# Elements that separate runs of text when extracting it.
+_BLOCK = frozenset(
+    {
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "br",
+        "dd",
+        "div",
+        "dl",
+        "dt",
+        "figcaption",
+        "figure",
+        "footer",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "header",
+        "hr",
+        "li",
+        "main",
+        "nav",
+        "ol",
+        "p",
+        "pre",
+        "section",
+        "table",
+        "td",
+        "th",
+        "tr",
+        "ul",
+    }
+)
+
+# Text extraction feeds the parser in small chunks so that it can stop soon
+# after it has enough text.
+_TEXT_CHUNK_SIZE = 4096
+
+
+class _StopParsingError(Exception):
+    """Raised from within a parser's handlers to stop parsing early."""
+
+
+class _TextParser(HTMLParser):
+    """Collects the visible text of a HTML document with whitespace collapsed."""
+
+    def __init__(self, limit: int | None) -> None:
+        super().__init__()
+        self.limit = limit
+        self.parts: list[str] = []
+        self.size = 0
+        # Is the text collected so far empty or ending in whitespace?
+        self.space = True
+        # How deeply nested within elements without visible text we are.
+        self.hidden = 0
+
+    def handle_starttag(self, tag, attrs) -> None:  # noqa: ARG002
+        if tag in _INVISIBLE:
+            self.hidden += 1
+        elif tag in _BLOCK:
+            self.handle_data(" ")
+
+    def handle_startendtag(self, tag, attrs) -> None:  # noqa: ARG002
+        if tag in _BLOCK:
+            self.handle_data(" ")
+
+    def handle_endtag(self, tag) -> None:
+        if tag in _INVISIBLE:
+            self.hidden = max(0, self.hidden - 1)
+        elif tag in _BLOCK:
+            self.handle_data(" ")
+
+    def handle_data(self, data) -> None:
+        if self.hidden:
+            return
+        text = _WHITESPACE.sub(" ", data)
+        if self.space:
+            text = text.lstrip(" ")
+        if text == "":
+            return
+        if self.limit is not None and self.size + len(text) > self.limit:
+            self.parts.append(text[: self.limit - self.size])
+            raise _StopParsingError
+        self.parts.append(text)
+        self.size += len(text)
+        self.space = text.endswith(" ")
+
+    def error(self, message: str) -> None:
+        # This method is undocumented in HTMLParser, but pylint is moaning
+        # about it, so...
+        logger.error("Error in TextParser: %s", message)  # pragma: no cover
+
+
+def _collapsed_prefix(data: str, chars: int, *, strip: bool) -> str:
+    """Return the prefix of some text with the given number of characters once its whitespace is collapsed.
+
+    Leading whitespace is ignored if `strip` is set, and the prefix never ends
+    with whitespace.
+    """
+    if chars <= 0:
+        return ""
+    end = 0
+    if strip and (match := _WHITESPACE.match(data)):
+        end = match.end()
+    for match in _WHITESPACE.finditer(data, end):
+        run = match.start() - end
+        if run >= chars:
+            break
+        # The run of whitespace collapses into a single space.
+        chars -= run + 1
+        if chars == 0:
+            return data[: match.start()]
+        end = match.end()
+    return data[: end + chars]
+
+
+class _ExcerptParser(HTMLParser):
+    """Copies a HTML document up to a given number of visible characters."""
+
+    def __init__(self, chars: int, ellipsis: str) -> None:
+        super().__init__()
+        self.remaining = chars
+        self.ellipsis = ellipsis
+        self.parts: list[str] = []
+        self.stack: list[str] = []
+        self.space = True
+        # Has a block-level element separated the text since the last word?
+        self.separated = False
+        self.hidden = 0
+
+    def _separate(self, tag: str) -> None:
+        if tag in _BLOCK and not self.space:
+            self.separated = True
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag in _INVISIBLE:
+            self.hidden += 1
+        elif not self.hidden:
+            self._separate(tag)
+            self.parts.append(_start_tag(tag, attrs))
+            if tag not in _SELF_CLOSING:
+                self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        if not self.hidden and tag not in _INVISIBLE:
+            self._separate(tag)
+            self.parts.append(_start_tag(tag, attrs) + _end_tag(tag))
+
+    def handle_endtag(self, tag) -> None:
+        if tag in _INVISIBLE:
+            self.hidden = max(0, self.hidden - 1)
+        elif not self.hidden:
+            self._separate(tag)
+            # Close the innermost open element with this tag, along with any
+            # elements left open within it, so the excerpt stays well formed.
+            for i in range(len(self.stack) - 1, -1, -1):
+                if self.stack[i] == tag:
+                    self._close_from(i)
+                    break
+
+    def handle_data(self, data) -> None:
+        if self.hidden:
+            return
+        # Characters are counted on the collapsed text, but the original is
+        # copied, so whitespace within elements such as `pre` survives.
+        text = _WHITESPACE.sub(" ", data)
+        if self.space:
+            text = text.lstrip(" ")
+        if text == "":
+            self.parts.append(data)
+            return
+        # The space extract_text puts between blocks counts towards the limit
+        # unless the text already starts with whitespace standing in for it.
+        remaining = self.remaining - (self.separated and not text.startswith(" "))
+        self.separated = False
+        if len(text) > remaining:
+            self.parts.append(escape(_collapsed_prefix(data, remaining, strip=self.space) + self.ellipsis, quote=False))
+            raise _StopParsingError
+        self.parts.append(escape(data, quote=False))
+        self.remaining = remaining - len(text)
+        self.space = text.endswith(" ")
+
+    def _close_from(self, i: int) -> None:
+        while len(self.stack) > i:
+            self.parts.append(f"</{self.stack.pop()}>")
+
+    def error(self, message: str) -> None:
+        # This method is undocumented in HTMLParser, but pylint is moaning
+        # about it, so...
+        logger.error("Error in ExcerptParser: %s", message)  # pragma: no cover
+
+
+def _feed_until_stopped(parser: HTMLParser, markup: Source, encoding: str) -> None:
+    with contextlib.suppress(_StopParsingError):
+        for chunk in _iter_chunks(markup, encoding, _TEXT_CHUNK_SIZE):
+            parser.feed(chunk)
+        parser.close()
+
+
+def extract_text(markup: Source, limit: int | None = None, *, encoding: str = "UTF-8") -> str:
+    """Extract the visible text from a HTML document.
+
+    Runs of whitespace are collapsed into a single space, and block-level
+    elements such as paragraphs are treated as separating words. The content
+    of `script`, `style`, and `template` elements is skipped. Parsing stops
+    as soon as the limit is reached.
+
+    Args:
+        markup: the document, as with [adjunct.html.iterparse][]
+        limit: the maximum number of characters to extract, if any
+        encoding: the text encoding to assume for binary input
+
+    Returns:
+        The document's text.
+    """
+    parser = _TextParser(limit)
+    _feed_until_stopped(parser, markup, encoding)
+    return "".join(parser.parts).rstrip(" ")
+
+
+def excerpt(
+    markup: Source,
+    chars: int,
+    *,
+    ellipsis: str = "\N{HORIZONTAL ELLIPSIS}",
+    encoding: str = "UTF-8",
+) -> str:
+    """Truncate a HTML document to a given number of visible characters.
+
+    The excerpt is well-formed markup: any elements open at the point of
+    truncation are closed. Visible text is counted as with
+    [adjunct.html.extract_text][], so a run of whitespace counts as a single
+    character, as does the space separating block-level elements, but the
+    text itself is copied unchanged. Parsing stops as soon as the limit is
+    reached.
+
+    Args:
+        markup: the document, as with [adjunct.html.iterparse][]
+        chars: the maximum number of visible characters to keep
+        ellipsis: text to append if the document was truncated
+        encoding: the text encoding to assume for binary input
+
+    Returns:
+        The excerpt.
+    """
+    parser = _ExcerptParser(chars, ellipsis)
+    _feed_until_stopped(parser, markup, encoding)
+    parser._close_from(0)
+    return "".join(parser.parts)
@@ -37,3 +37,39 @@ def load_json_documents(payloads: str) -> t.Iterator[dict | list]:
         obj, idx = decoder.raw_decode(payloads)
         yield obj
         payloads = payloads[idx:]
+
+
+def unpack_key(keys: t.Sequence[str], index: t.Any) -> str:
+    """Look up a key in the key table of a packed JSON document.
+
+    Args:
+        keys: the table of keys
+        index: the index of the key, as decoded from JSON
+
+    Returns:
+        The key.
+
+    Raises:
+        TypeError: if the index isn't a valid index of a string key.
+    """
+    # JSON booleans decode as ints, and negative indices would wrap around.
+    if type(index) is not int or not 0 <= index < len(keys) or not isinstance(keys[index], str):
+        raise TypeError("Bad key index")
+    return keys[index]
+
+
+def unpack_str(value: t.Any) -> str:
+    """Check that a value decoded from a packed JSON document is a string.
+
+    Args:
+        value: the value, as decoded from JSON
+
+    Returns:
+        The value.
+
+    Raises:
+        TypeError: if the value isn't a string.
+    """
+    if not isinstance(value, str):
+        raise TypeError("Bad value")
+    return value
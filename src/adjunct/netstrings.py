@@ -1,8 +1,9 @@
-"""Simple [netstring] reader implemented as a generator.
+"""Simple [netstring] readers and writers, both blocking and asynchronous.
 
 [netstring]: http://cr.yp.to/proto/netstrings.txt
 """
 
+import asyncio
 import io
 import typing as t
 
@@ -24,44 +25,363 @@ def parse(ns: bytes) -> t.Sequence[bytes]:
         return list(netstring_reader(fh))
 
 
-def netstring_reader(fd: io.BufferedIOBase) -> t.Iterable[bytes]:  # noqa: C901
+# The longest length prefix allowed, enough for payloads of up to 9,999,999,999
+# bytes.
+_MAX_LENGTH_DIGITS = 10
+_BUFFER_SIZE = 65536
+_COMMA = ord(",")
+_ZERO = ord("0")
+
+
+def _get_readinto(fd: t.Any) -> t.Callable[[memoryview], int | None]:
+    """Find the best way of reading from the file object into a buffer."""
+    # Read what's available rather than blocking until the buffer's full, in
+    # case we're reading from something interactive like a socket.
+    readinto = getattr(fd, "readinto1", None) or getattr(fd, "readinto", None)
+    if readinto is not None:
+        return readinto
+
+    def read(view: memoryview) -> int:
+        data = fd.read(len(view))
+        view[: len(data)] = data
+        return len(data)
+
+    return read
+
+
+class _ReadBuffer:
+    """The reusable read buffer behind [adjunct.netstrings.netstring_views][]."""
+
+    __slots__ = ("buf", "end", "eof", "readinto", "start", "view")
+
+    def __init__(self, fd: io.BufferedIOBase, size: int) -> None:
+        self.readinto = _get_readinto(fd)
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        # The unconsumed data is buf[start:end].
+        self.start = 0
+        self.end = 0
+        self.eof = False
+
+    def fill(self) -> None:
+        """Read more data into the buffer after moving any unconsumed data to the front."""
+        if self.start > 0:
+            # The same length is being assigned, so this won't try to resize
+            # the buffer, which isn't allowed while views of it are exported.
+            self.buf[: self.end - self.start] = self.buf[self.start : self.end]
+            self.end -= self.start
+            self.start = 0
+        n = self.readinto(self.view[self.end :])
+        self.end += n or 0
+        self.eof = not n
+
+    def read_length(self) -> int | None:
+        """Read a length prefix, or return `None` if the stream ended before one."""
+        buf = self.buf
+        while True:
+            colon = buf.find(b":", self.start, min(self.end, self.start + _MAX_LENGTH_DIGITS + 1))
+            if colon != -1 or self.eof or self.end - self.start > _MAX_LENGTH_DIGITS:
+                break
+            self.fill()
+        start = self.start
+        if start < self.end and buf[start] == _ZERO and colon != start + 1:
+            raise MalformedNetstringError("Disallowed leading zero")
+        if colon == -1:
+            if self.end - start > _MAX_LENGTH_DIGITS:
+                raise MalformedNetstringError("Length too long")
+            if start < self.end:
+                raise MalformedNetstringError("Connection closed too early")
+            return None
+        if not buf[start:colon].isdigit():
+            raise MalformedNetstringError("Bad length")
+        self.start = colon + 1
+        return int(buf[start:colon])
+
+    def read_payload(self, size: int) -> memoryview:
+        """Read a payload of the given size and its trailing comma."""
+        if size < len(self.buf):
+            while self.end - self.start <= size and not self.eof:
+                self.fill()
+            if self.end - self.start < size:
+                raise MalformedNetstringError("Connection closed too early")
+            if self.end - self.start == size or self.buf[self.start + size] != _COMMA:
+                raise MalformedNetstringError("Missing trailing comma")
+            payload = self.view[self.start : self.start + size]
+            self.start += size + 1
+            return payload
+
+        # The payload gets its own buffer, which grows as data arrives rather
+        # than being allocated up front, so a bogus length prefix can't be
+        # used to make us allocate far more memory than was ever sent.
+        large = bytearray(self.view[self.start : self.end])
+        self.start = self.end = 0
+        while len(large) < size:
+            n = self.readinto(self.view[: min(len(self.buf), size - len(large))])
+            if not n:
+                raise MalformedNetstringError("Connection closed too early")
+            large += self.view[:n]
+        self.fill()
+        if self.start == self.end or self.buf[self.start] != _COMMA:
+            raise MalformedNetstringError("Missing trailing comma")
+        self.start += 1
+        return memoryview(large)
+
+
+def netstring_views(fd: io.BufferedIOBase, buffer_size: int = _BUFFER_SIZE) -> t.Iterator[memoryview]:
+    """Reads a sequence of netstrings from the given file object without copying.
+
+    The stream is read in blocks into a buffer that's reused, and netstrings
+    that fit in it are reported as views into it. Netstrings that don't fit
+    get their own buffer. Each view is only valid until the next netstring is
+    read, so copy it if you need to hold onto it.
+
+    Args:
+        fd: a file-like object to read from; it's read with `readinto1()` or
+            `readinto()` if it has either, and `read()` otherwise
+        buffer_size: the size of the read buffer; it's at least big enough
+            for the longest possible length prefix
+
+    Yields:
+        a view of each netstring
+
+    Raises:
+        MalformedNetstringError: if the stream isn't made up of well-formed
+            netstrings
+    """
+    # There has to be room for the longest possible length prefix.
+    reader = _ReadBuffer(fd, max(buffer_size, _MAX_LENGTH_DIGITS + 2))
+    buf = reader.buf
+    view = reader.view
+    find = buf.find
+    while True:
+        # The fast path, for when whole netstrings are already buffered.
+        start, end = reader.start, reader.end
+        while True:
+            colon = find(b":", start, end)
+            if not 0 <= colon - start <= _MAX_LENGTH_DIGITS:
+                break
+            digits = buf[start:colon]
+            if not digits.isdigit() or (digits[0] == _ZERO and colon != start + 1):
+                break
+            comma = colon + 1 + int(digits)
+            if comma >= end:
+                break
+            if buf[comma] != _COMMA:
+                raise MalformedNetstringError("Missing trailing comma")
+            yield view[colon + 1 : comma]
+            start = comma + 1
+        reader.start = start
+
+        size = reader.read_length()
+        if size is None:
+            return
+        yield reader.read_payload(size)
+
+
+def netstring_reader(fd: io.BufferedIOBase, buffer_size: int = _BUFFER_SIZE) -> t.Iterable[bytes]:
     """Reads a sequence of netstrings from the given file object.
 
+    This is a wrapper around [adjunct.netstrings.netstring_views][] that
+    copies each netstring.
+
     Args:
         fd: a file-like object to read from
+        buffer_size: the size of the read buffer
 
     Yields:
         netstrings
     """
-    while True:
-        buffered = b""
-        n = 0
+    for payload in netstring_views(fd, buffer_size):
+        yield bytes(payload)
+
+
+class NetstringDecoder:
+    """An incremental netstring decoder that doesn't do any I/O itself.
+
+    This is for when you can't use [adjunct.netstrings.netstring_reader][],
+    such as when reading from non-blocking sockets: feed it data as it
+    arrives, and it gives back whatever netstrings are complete.
+
+    Examples:
+        >>> decoder = NetstringDecoder(max_size=1024)
+        >>> decoder.feed(b"5:hel")
+        []
+        >>> decoder.feed(b"lo,0:,3")
+        [b'hello', b'']
+        >>> decoder.feed(b":bye,")
+        [b'bye']
+        >>> decoder.close()
+
+    Args:
+        max_size: the largest payload to accept, if any; larger payloads are
+            rejected as soon as their length is known, before any of them is
+            buffered
+
+    Note:
+        After a `MalformedNetstringError` is raised, the decoder's state is
+        undefined and it shouldn't be fed any more data.
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        self._buffer = bytearray()
+        self._max_size = max_size
+        # The size of the payload being read, if its length prefix has been.
+        self._size: int | None = None
+
+    def _check_size(self, size: int) -> None:
+        if self._max_size is not None and size > self._max_size:
+            raise MalformedNetstringError("Payload too large")
+
+    def _read_length(self, start: int) -> tuple[int, int] | None:
+        """Parse the length prefix at the given offset, if it's all there."""
+        buf = self._buffer
+        colon = buf.find(b":", start, start + _MAX_LENGTH_DIGITS + 1)
+        digits = buf[start:] if colon == -1 else buf[start:colon]
+        if len(digits) > _MAX_LENGTH_DIGITS:
+            raise MalformedNetstringError("Length too long")
+        if len(digits) > 1 and digits[0] == _ZERO:
+            raise MalformedNetstringError("Disallowed leading zero")
+        if not digits.isdigit():
+            if colon != -1 or digits:
+                raise MalformedNetstringError("Bad length")
+            return None
+        # Even if the length isn't all there yet, it might be too big already.
+        self._check_size(int(digits))
+        return None if colon == -1 else (int(digits), colon + 1)
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[bytes]:
+        """Feed data to the decoder.
+
+        Args:
+            data: the data received
+
+        Returns:
+            Any netstrings completed by the data.
+
+        Raises:
+            MalformedNetstringError: if the data isn't made up of well-formed
+                netstrings
+        """
+        buf = self._buffer
+        buf += data
+        result = []
+        start = 0
         while True:
-            ch = fd.read(1)
-            if ch == b"":
-                return
-            if ch == b":":
-                break
-            n += 1
-            if n > 10:
-                raise MalformedNetstringError("Length too long")
-            if ch == b"0" and buffered == b"":
-                if fd.read(1) != b":":
-                    raise MalformedNetstringError("Disallowed leading zero")
-                buffered = ch
+            if self._size is None:
+                length = self._read_length(start)
+                if length is None:
+                    break
+                self._size, start = length
+            end = start + self._size
+            if len(buf) <= end:
                 break
-            buffered += ch
-        try:
-            size = int(buffered.decode(), 10)
-        except ValueError:
-            raise MalformedNetstringError("Bad length") from None
-        payload = b""
-        while size > 0:
-            buffered = fd.read(size)
-            if buffered == b"":
-                raise MalformedNetstringError("Connection closed too early")
-            payload += buffered
-            size -= len(buffered)
-        if fd.read(1) != b",":
-            raise MalformedNetstringError("Missing trailing comma")
+            if buf[end] != _COMMA:
+                raise MalformedNetstringError("Missing trailing comma")
+            result.append(bytes(buf[start:end]))
+            start = end + 1
+            self._size = None
+        del buf[:start]
+        return result
+
+    def close(self) -> None:
+        """Signal that there's no more data.
+
+        Raises:
+            MalformedNetstringError: if there's an incomplete netstring
+        """
+        if self._size is not None or self._buffer:
+            raise MalformedNetstringError("Connection closed too early")
+
+
+def encode(payload: bytes) -> bytes:
+    """Encode a payload as a netstring.
+
+    Args:
+        payload: the payload to encode
+
+    Returns:
+        The netstring.
+    """
+    return b"%d:%b," % (len(payload), payload)
+
+
+async def _read_length(reader: asyncio.StreamReader) -> int | None:
+    """Read a length prefix, or return `None` if the stream ended before one."""
+    try:
+        prefix = await reader.readuntil(b":")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial:
+            raise MalformedNetstringError("Connection closed too early") from None
+        return None
+    except asyncio.LimitOverrunError:
+        # The stream's buffer filled up without a colon turning up.
+        raise MalformedNetstringError("Length too long") from None
+    digits = prefix[:-1]
+    if len(digits) > _MAX_LENGTH_DIGITS:
+        raise MalformedNetstringError("Length too long")
+    if len(digits) > 1 and digits[0] == _ZERO:
+        raise MalformedNetstringError("Disallowed leading zero")
+    if not digits.isdigit():
+        raise MalformedNetstringError("Bad length")
+    return int(digits)
+
+
+async def read_netstring(reader: asyncio.StreamReader, max_size: int | None = None) -> bytes | None:
+    """Read a netstring from an asyncio stream.
+
+    Args:
+        reader: the stream to read from
+        max_size: the largest payload to accept, if any
+
+    Returns:
+        The netstring, or `None` if the stream ended cleanly before it.
+
+    Raises:
+        MalformedNetstringError: if the stream doesn't contain a well-formed
+            netstring
+    """
+    size = await _read_length(reader)
+    if size is None:
+        return None
+    if max_size is not None and size > max_size:
+        raise MalformedNetstringError("Payload too large")
+    try:
+        payload = await reader.readexactly(size)
+        comma = await reader.readexactly(1)
+    except asyncio.IncompleteReadError:
+        raise MalformedNetstringError("Connection closed too early") from None
+    if comma != b",":
+        raise MalformedNetstringError("Missing trailing comma")
+    return payload
+
+
+async def iter_netstrings(reader: asyncio.StreamReader, max_size: int | None = None) -> t.AsyncIterator[bytes]:
+    """Read a sequence of netstrings from an asyncio stream.
+
+    Args:
+        reader: the stream to read from
+        max_size: the largest payload to accept, if any
+
+    Yields:
+        netstrings, until the stream ends
+
+    Raises:
+        MalformedNetstringError: if the stream isn't made up of well-formed
+            netstrings
+    """
+    while (payload := await read_netstring(reader, max_size)) is not None:
         yield payload
+
+
+async def write_netstring(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    """Write a netstring to an asyncio stream.
+
+    The payload is written as-is rather than being copied into a netstring
+    first, and the stream is drained afterwards.
+
+    Args:
+        writer: the stream to write to
+        payload: the payload to write
+    """
+    writer.writelines((b"%d:" % len(payload), payload, b","))
+    await writer.drain()
@@ -24,8 +24,15 @@ an initial context is set up consisting of the namespaces given on that page.
 
 import dataclasses
 import html
+import json
 import typing as t
 
+from .jsonutils import unpack_key, unpack_str
+
+# Version tag for the packed representation; bump it whenever the layout
+# produced by `pack` changes so stale cache entries are rejected.
+_PACK_VERSION = 1
+
 
 @dataclasses.dataclass
 class Property:
@@ -110,3 +117,58 @@ def find(
     for prop in props:
         if prop.type_ == type_ and (value is None or prop.value == value):
             yield prop
+
+
+def pack(props: t.Iterable[Property]) -> bytes:
+    """Encode Open Graph properties in a compact form suitable for caching.
+
+    Property types and metadata keys tend to repeat heavily, so each distinct
+    one is stored once in a table and referred to by index.
+
+    Args:
+        props: the `Property` instances to encode.
+
+    Returns:
+        The encoded properties.
+    """
+    keys: dict[str, int] = {}
+    body = []
+    for prop in props:
+        record: list[str | int] = [keys.setdefault(prop.type_, len(keys)), prop.value]
+        for key, value in prop.metadata.items():
+            record.append(keys.setdefault(key, len(keys)))
+            record.append(value)
+        body.append(record)
+    return json.dumps([_PACK_VERSION, list(keys), body], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def unpack(data: bytes) -> list[Property]:
+    """Decode Open Graph properties encoded with [adjunct.ogp.pack][].
+
+    Args:
+        data: the encoded properties.
+
+    Returns:
+        The `Property` instances.
+
+    Raises:
+        ValueError: if the data is malformed or was packed by an incompatible
+            version of this module.
+    """
+    try:
+        version, keys, body = json.loads(data)
+    except (TypeError, ValueError):
+        raise ValueError("Malformed packed properties") from None
+    if version != _PACK_VERSION:
+        raise ValueError(f"Unsupported packed properties version: {version!r}")
+    try:
+        return [
+            Property(
+                unpack_key(keys, record[0]),
+                unpack_str(record[1]),
+                {unpack_key(keys, record[i]): unpack_str(record[i + 1]) for i in range(2, len(record), 2)},
+            )
+            for record in body
+        ]
+    except (IndexError, KeyError, TypeError, ValueError):
+        raise ValueError("Malformed packed properties") from None
@@ -3,18 +3,39 @@
 [OPML]: http://dev.opml.org/spec2.html
 """
 
+import abc
+import collections
+import collections.abc
+from concurrent import futures
+import dataclasses
 import datetime
 import email.utils
+import functools
+import mmap
+import os
+import re
 import typing as t
-import xml.sax
-import xml.sax.handler
+from urllib import parse as urlparse
+from xml.parsers import expat
+
+from .xmlutils import XMLBuilder
 
 __all__ = [
     "OpmlError",
     "Outline",
+    "OutlineDiff",
+    "OutlineStream",
+    "ParseResult",
+    "diff",
+    "index_feeds",
+    "iterparse",
+    "merge",
     "parse",
+    "parse_many",
     "parse_string",
     "parse_timestamp",
+    "parse_timestamps",
+    "write",
 ]
 
 
@@ -22,12 +43,106 @@ class OpmlError(Exception):
     """Raised when there's a problem parsing an OPML document."""
 
 
+# Attributes of outlines that default to "false" if omitted.
+_OUTLINE_DEFAULTS = {"isComment": "false", "isBreakpoint": "false"}
+
+
+class _OutlineAttrs(dict[str, str]):
+    """The attributes of a parsed outline, falling back on the defaults.
+
+    Only the attributes present in the document are stored, but the defaults
+    show through everywhere else, so it compares, iterates, and serialises
+    like a dict holding them. Deleting an attribute with a default reverts it
+    to that default. The one exception is `json`'s C encoder, which writes an
+    outline with no attributes of its own as `{}`.
+    """
+
+    __slots__ = ()
+    __hash__ = None
+
+    def __missing__(self, key: str) -> str:
+        return _OUTLINE_DEFAULTS[key]
+
+    def __delitem__(self, key: str) -> None:
+        if dict.pop(self, key, None) is None and key not in _OUTLINE_DEFAULTS:
+            raise KeyError(key)
+
+    def __iter__(self) -> t.Iterator[str]:
+        yield from dict.__iter__(self)
+        for key in _OUTLINE_DEFAULTS:
+            if not dict.__contains__(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + sum(not dict.__contains__(self, key) for key in _OUTLINE_DEFAULTS)
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or key in _OUTLINE_DEFAULTS
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self) == dict(other)
+
+    def __ne__(self, other: object) -> bool:
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self) != dict(other)
+
+    def __or__(self, other: t.Any) -> t.Any:
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self) | other
+
+    def __ror__(self, other: t.Any) -> t.Any:
+        if not isinstance(other, dict):
+            return NotImplemented
+        return other | dict(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def get(self, key: str, default: t.Any = None) -> t.Any:
+        return dict.get(self, key, _OUTLINE_DEFAULTS.get(key, default))
+
+    def pop(self, key: str, *args: t.Any) -> t.Any:
+        if not dict.__contains__(self, key) and key in _OUTLINE_DEFAULTS:
+            return _OUTLINE_DEFAULTS[key]
+        return dict.pop(self, key, *args)
+
+    def setdefault(self, key: str, default: str) -> str:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def keys(self) -> t.KeysView[str]:  # type: ignore[override]
+        return collections.abc.KeysView(self)
+
+    def items(self) -> t.ItemsView[str, str]:  # type: ignore[override]
+        return collections.abc.ItemsView(self)
+
+    def values(self) -> t.ValuesView[str]:  # type: ignore[override]
+        return collections.abc.ValuesView(self)
+
+    def copy(self) -> "_OutlineAttrs":
+        return _OutlineAttrs(dict.copy(self))
+
+
+def _own_attrs(attrs: dict[str, str]) -> dict[str, str]:
+    """Get the attributes actually present, leaving out any defaults."""
+    return dict.copy(attrs) if isinstance(attrs, _OutlineAttrs) else attrs
+
+
 class Outline(list):
     """An outline.
 
     Contains the element's attributes in the `attrs` member and the outlines
     nested within it as elements.
 
+    Outlines are slotted. Parsed outlines store only the attributes present
+    in the document, with the `isComment` and `isBreakpoint` attributes
+    defaulting to `"false"` when absent.
+
     Args:
         attrs: any attributes on the element
         items: any child outlines nested within this outline
@@ -38,6 +153,8 @@ class Outline(list):
         root: is this outline the root outline?
     """
 
+    __slots__ = ("attrs", "root")
+
     def __init__(
         self,
         attrs: dict[str, str] | None = None,
@@ -45,136 +162,668 @@ class Outline(list):
         *,
         root: bool = False,
     ):
-        super().__init__()
+        super().__init__(items)
         self.attrs: dict[str, str] = {} if attrs is None else attrs
         self.root: bool = root
-        self.extend(items)
 
     def __repr__(self):
         args = []
         if self.root:
             args.append("root=True")
-        if len(self.attrs) > 0:
+        if len(_own_attrs(self.attrs)) > 0:
             args.append(f"attrs={self.attrs!r}")
         if len(self) > 0:
             args.append(f"items={list(self)!r}")
         return f"Outline({', '.join(args)})"
 
 
-class _Handler(xml.sax.handler.ContentHandler):
-    """Implements the mechanics of parsing an OPML document."""
-
-    _HEAD_TAGS = [  # noqa: RUF012
-        "title",
-        "dateCreated",
-        "dateModified",
-        "ownerName",
-        "ownerEmail",
-        "ownerId",
-        "docs",
-        "expansionState",
-        "vertScrollState",
-        "windowTop",
-        "windowLeft",
-        "windowBottom",
-        "windowRight",
+_HEAD_TAGS = (
+    "title",
+    "dateCreated",
+    "dateModified",
+    "ownerName",
+    "ownerEmail",
+    "ownerId",
+    "docs",
+    "expansionState",
+    "vertScrollState",
+    "windowTop",
+    "windowLeft",
+    "windowBottom",
+    "windowRight",
+)
+_HEAD_TAG_SET = frozenset(_HEAD_TAGS)
+
+# Some simplistic validation: ensure that the elements in the document are
+# nested as we'd expect. Each entry gives the elements allowed within the
+# parent along with how to describe them in error messages.
+_NESTING: dict[str | None, tuple[frozenset[str], str]] = {
+    parent: (frozenset(children), "|".join(children))
+    for parent, children in [
+        (None, ("opml",)),
+        ("opml", ("head", "body")),
+        ("head", _HEAD_TAGS),
+        ("body", ("outline",)),
+        ("outline", ("outline",)),
     ]
+}
+
+# Attribute names expat should share between every document it parses;
+# other names are only shared within a single document.
+_NAMES = {
+    name: name
+    for name in (
+        *_OUTLINE_DEFAULTS,
+        "category",
+        "created",
+        "description",
+        "htmlUrl",
+        "language",
+        "text",
+        "title",
+        "type",
+        "url",
+        "version",
+        "xmlUrl",
+    )
+}
+
+# How much of a document to feed to the parser at a time.
+_CHUNK_SIZE = 65536
 
-    # Some simplistic validation: ensure that the elements in the document
-    # are nested as we'd expect.
-    _NESTING = {  # noqa: RUF012
-        None: ["opml"],
-        "opml": ["head", "body"],
-        "head": _HEAD_TAGS,
-        "body": ["outline"],
-        "outline": ["outline"],
-    }
-
-    def __init__(self):
-        super().__init__()
-        self.tag_stack = []
-        self.outline_stack = []
-        self.root = None
-        self.current = None
-
-    def _get_parent_tag(self):
-        """
-        Oh, guess!
-        """
-        return None if len(self.tag_stack) == 0 else self.tag_stack[-1]
-
-    def startDocument(self):  # noqa: N802
-        self.root = Outline(root=True)
-        self.outline_stack = [self.root]
-        self.tag_stack = []
 
-    def endDocument(self):  # noqa: N802
-        self.current = None
+class _Parser(abc.ABC):
+    """Implements the mechanics of parsing an OPML document.
 
-    def startElement(self, name, attrs):  # noqa: N802
-        expected = self._NESTING[self._get_parent_tag()]
-        if name not in expected:
-            raise OpmlError(f"Got <{name}>, expected <{'|'.join(expected)}>")
+    This sits directly on top of expat. Subclasses decide what to do with the
+    outlines in the document.
+    """
 
+    def __init__(self) -> None:
+        self.parser = expat.ParserCreate(intern=dict(_NAMES))
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.characters
+        self.tag_stack: list[str] = []
+        self.text: list[str] = []
+        self.head: dict[str, str] = {}
+        self.in_body = False
+
+    def feed(self, data: str | bytes | memoryview, *, final: bool = False) -> None:
+        try:
+            self.parser.Parse(data, final)
+        except expat.ExpatError as exc:
+            raise OpmlError(f"Malformed document: {exc}") from None
+
+    def feed_file(self, fh: t.IO, chunk_size: int = _CHUNK_SIZE) -> None:
+        while chunk := fh.read(chunk_size):
+            self.feed(chunk)
+        self.feed(b"", final=True)
+
+    def feed_buffer(self, data: str | bytes | bytearray | memoryview | mmap.mmap) -> None:
+        if isinstance(data, str):
+            self.feed(data, final=True)
+            return
+        # Feeding a large buffer a piece at a time keeps expat's own internal
+        # buffer small.
+        with memoryview(data) as view:
+            for i in range(0, len(view), _CHUNK_SIZE):
+                self.feed(view[i : i + _CHUNK_SIZE])
+        self.feed(b"", final=True)
+
+    def start_element(self, name: str, attrs: dict[str, str]) -> None:
+        parent = self.tag_stack[-1] if self.tag_stack else None
+        allowed, description = _NESTING.get(parent, (frozenset(), ""))
+        if name not in allowed:
+            raise OpmlError(f"Got <{name}>, expected <{description}>")
         self.tag_stack.append(name)
         if name == "outline":
-            outline = Outline()
-            self.outline_stack[-1].append(outline)
-            self.outline_stack.append(outline)
-            outline.attrs = dict(attrs.items())
-            for attr in ("isComment", "isBreakpoint"):
-                outline.attrs.setdefault(attr, "false")
-
-    def endElement(self, name):  # noqa: N802
+            self.start_outline(attrs)
+        elif name == "body":
+            self.in_body = True
+
+    def end_element(self, name: str) -> None:
         self.tag_stack.pop()
         if name == "outline":
-            self.outline_stack.pop()
+            self.end_outline()
+        elif name in _HEAD_TAG_SET:
+            content = "".join(self.text).strip()
+            self.text.clear()
+            if content != "":
+                self.head[name] = content
+
+    def characters(self, content: str) -> None:
+        if self.tag_stack and self.tag_stack[-1] in _HEAD_TAG_SET:
+            self.text.append(content)
+
+    @abc.abstractmethod
+    def start_outline(self, attrs: dict[str, str]) -> None:
+        """Handle the start of an outline with the given attributes."""
+
+    @abc.abstractmethod
+    def end_outline(self) -> None:
+        """Handle the end of the most recently started outline."""
+
+
+def _title(attrs: t.Mapping[str, str]) -> str:
+    return attrs.get("text", attrs.get("title", ""))
+
+
+class _TreeParser(_Parser):
+    """Builds an [Outline][adjunct.opml.Outline] tree from an OPML document."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.root = Outline(self.head, root=True)
+        self.outline_stack = [self.root]
+
+    def start_outline(self, attrs: dict[str, str]) -> None:
+        outline = Outline(_OutlineAttrs(attrs))
+        self.outline_stack[-1].append(outline)
+        self.outline_stack.append(outline)
+
+    def end_outline(self) -> None:
+        self.outline_stack.pop()
+
 
-    def characters(self, content):
-        content = content.strip()
-        parent = self._get_parent_tag()
-        if content != "" and parent in self._HEAD_TAGS and self.root is not None:
-            self.root.attrs[parent] = content
+class _StreamParser(_Parser):
+    """Reports outlines as they're encountered rather than building a tree."""
+
+    def __init__(self, *, defaults: bool = True) -> None:
+        super().__init__()
+        self.defaults = defaults
+        self.events: collections.deque[tuple[int, tuple[str, ...], dict[str, str]]] = collections.deque()
+        self.titles: list[str] = []
+        # The paths of the open outlines, built as they're first needed so
+        # that siblings share the same tuple.
+        self.paths: list[tuple[str, ...]] = [()]
+
+    def start_outline(self, attrs: dict[str, str]) -> None:
+        if self.defaults:
+            for key, value in _OUTLINE_DEFAULTS.items():
+                attrs.setdefault(key, value)
+        depth = len(self.titles)
+        while len(self.paths) <= depth:
+            self.paths.append((*self.paths[-1], self.titles[len(self.paths) - 1]))
+        self.events.append((depth, self.paths[depth], attrs))
+        self.titles.append(_title(attrs))
+
+    def end_outline(self) -> None:
+        self.titles.pop()
+        del self.paths[len(self.titles) + 1 :]
+
+
+class OutlineStream:
+    """An iterator over the outlines in an OPML document.
+
+    Each outline is reported as a tuple of its depth, the titles of the
+    outlines it's nested within, and its attributes. The document is read and
+    parsed a chunk at a time, and no tree is built, so memory use is bounded
+    no matter how many outlines the document has.
+
+    It's recommended you use [adjunct.opml.iterparse][] rather than
+    instantiating this class directly.
+
+    Args:
+        fh: a file-like object containing an OPML document
+        chunk_size: the amount to read from the file at a time
+        defaults: fill in the `isComment` and `isBreakpoint` attributes when
+            they're absent
+
+    Attributes:
+        head: the metadata from the head of the document; this is available
+            as soon as the stream is created
+    """
+
+    def __init__(self, fh: t.IO, chunk_size: int = _CHUNK_SIZE, *, defaults: bool = True) -> None:
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._parser = _StreamParser(defaults=defaults)
+        self._done = False
+        # The head comes before the body, so reading up to the start of the
+        # body ensures we have all of it.
+        while not self._parser.in_body and not self._done:
+            self._read()
+        self.head: dict[str, str] = self._parser.head
+
+    def _read(self) -> None:
+        chunk = self._fh.read(self._chunk_size)
+        self._done = not chunk
+        self._parser.feed(chunk, final=self._done)
+
+    def __iter__(self) -> "OutlineStream":
+        return self
+
+    def __next__(self) -> tuple[int, tuple[str, ...], dict[str, str]]:
+        while not self._parser.events:
+            if self._done:
+                raise StopIteration
+            self._read()
+        return self._parser.events.popleft()
+
+
+def iterparse(fh: t.IO, chunk_size: int = _CHUNK_SIZE) -> OutlineStream:
+    """Incrementally parse an OPML file from the given file object.
+
+    The same validation is applied as with [adjunct.opml.parse][].
+
+    Examples:
+        >>> with open("subscriptions.opml", "rb") as fh:
+        ...     outlines = iterparse(fh)
+        ...     print(outlines.head.get("title"))
+        ...     for depth, path, attrs in outlines:
+        ...         if "xmlUrl" in attrs:
+        ...             print("/".join(path), attrs["xmlUrl"])
+
+    Args:
+        fh: a file-like object containing an OPML document
+        chunk_size: the amount to read from the file at a time
+
+    Returns:
+        An iterator over the document's outlines.
+
+    Raises:
+        OpmlError: if the document is malformed or invalid.
+    """
+    return OutlineStream(fh, chunk_size)
 
 
+class ParseResult(t.NamedTuple):
+    """The outcome of parsing one of the files given to [adjunct.opml.parse_many][].
+
+    Attributes:
+        path: the path of the file
+        head: the metadata from the head of the document
+        rows: the outlines in the document, as reported by
+            [adjunct.opml.iterparse][], except that the `isComment` and
+            `isBreakpoint` attributes are only present if the document
+            gives them
+        error: a description of why the file couldn't be parsed, or `None` if
+            it was parsed successfully
+    """
+
+    path: str
+    head: dict[str, str]
+    rows: list[tuple[int, tuple[str, ...], dict[str, str]]]
+    error: str | None
+
+
+def _parse_path(path: str, chunk_size: int = _CHUNK_SIZE) -> ParseResult:
+    try:
+        with open(path, "rb") as fh:
+            outlines = OutlineStream(fh, chunk_size, defaults=False)
+            return ParseResult(path, outlines.head, list(outlines), None)
+    except (OSError, OpmlError) as exc:
+        return ParseResult(path, {}, [], str(exc))
+
+
+def parse_many(
+    paths: t.Iterable[str | os.PathLike],
+    workers: int | None = None,
+    *,
+    chunksize: int = 16,
+) -> t.Iterator[ParseResult]:
+    """Parse a batch of OPML files in parallel using worker processes.
+
+    Rather than sending whole trees back from the workers, each document is
+    flattened into the rows reported by [adjunct.opml.iterparse][], which are
+    much cheaper to pickle and unpickle; default attributes are left out, and
+    siblings share their path, to keep them small. A file that can't be read
+    or parsed doesn't abort the batch: its error is reported in its result
+    instead. If the iterator is closed early, files not yet started are
+    cancelled.
+
+    Args:
+        paths: the paths of the files to parse
+        workers: the number of worker processes to use; defaults to the
+            number of processors
+        chunksize: the number of files to send to a worker at a time
+
+    Returns:
+        An iterator over the results, in the same order as the paths.
+    """
+    executor = futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield from executor.map(_parse_path, map(os.fspath, paths), chunksize=chunksize)
+    finally:
+        # Exiting the executor's context would wait for every pending file.
+        executor.shutdown(cancel_futures=True)
+
+
+_MONTHS = {
+    month: i
+    for i, month in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)
+}
+_TIMESTAMP = re.compile(
+    r"""
+    \s*(?:[A-Z][a-z]{2},\s*)?
+    (\d{1,2})\ ([A-Z][a-z]{2})\ (\d{4})\ (\d{2}):(\d{2}):(\d{2})\ ([+-])(\d{2})(\d{2})
+    \s*$
+    """,
+    re.VERBOSE | re.ASCII,
+)
+
+
+def _parse_common(ts: str) -> datetime.datetime | None:
+    """Parse the most common form of RFC 2822 timestamp without `email.utils`."""
+    m = _TIMESTAMP.match(ts)
+    if m is None:
+        return None
+    day, month_name, year, hour, minute, second, sign, tz_hours, tz_minutes = m.groups()
+    month = _MONTHS.get(month_name)
+    offset = int(tz_hours) * 60 + int(tz_minutes)
+    # "-0000" means the local timezone is unknown, which email.utils treats
+    # differently, so leave it and leap seconds to the slow path.
+    if month is None or (sign == "-" and offset == 0) or second == "60":
+        return None
+    try:
+        dt = datetime.datetime(int(year), month, int(day), int(hour), int(minute), int(second), tzinfo=datetime.UTC)
+    except ValueError:
+        return None
+    return dt + datetime.timedelta(minutes=offset if sign == "-" else -offset)
+
+
+@functools.lru_cache(maxsize=4096)
 def parse_timestamp(ts: str) -> datetime.datetime | None:
     """Convert an RFC 2822 timestamp (as used in OPML) to a UTC DateTime object.
 
+    Timestamps of the form `Fri, 21 Nov 1997 09:55:06 -0600` are parsed
+    directly, with anything else going through `email.utils`. As feeds and
+    outlines tend to repeat the same timestamps, recent results are cached.
+
     Args:
         ts: an RFC 2822 timestamp
 
     Returns:
         A timezone-aware datetime, or `None` if the timestamp could not be parsed.
     """
+    dt = _parse_common(ts)
+    if dt is not None:
+        return dt
     tt = email.utils.parsedate_tz(ts)
     if tt is None:
         return None
     return datetime.datetime.fromtimestamp(email.utils.mktime_tz(tt), tz=datetime.UTC)
 
 
-def parse(fh: t.TextIO) -> Outline | None:
+@t.overload
+def parse_timestamps(
+    timestamps: t.Iterable[str],
+    *,
+    epoch: t.Literal[False] = False,
+) -> t.Iterator[datetime.datetime | None]: ...
+
+
+@t.overload
+def parse_timestamps(timestamps: t.Iterable[str], *, epoch: t.Literal[True]) -> t.Iterator[float | None]: ...
+
+
+def parse_timestamps(
+    timestamps: t.Iterable[str],
+    *,
+    epoch: bool = False,
+) -> t.Iterator[datetime.datetime | None] | t.Iterator[float | None]:
+    """Convert a batch of RFC 2822 timestamps.
+
+    Args:
+        timestamps: the RFC 2822 timestamps to convert
+        epoch: if true, give the number of seconds since the epoch rather
+            than a datetime
+
+    Returns:
+        An iterator over the converted timestamps, with `None` for any that
+        could not be parsed.
+    """
+    if not epoch:
+        return map(parse_timestamp, timestamps)
+    return (None if dt is None else dt.timestamp() for dt in map(parse_timestamp, timestamps))
+
+
+def parse(fh: t.IO) -> Outline | None:
     """Parses an OPML file from the given file object.
 
     Args:
-        fh: a file-like object containing an OPML document
+        fh: a file-like object containing an OPML document, opened in either
+            text or binary mode
 
     Returns:
         An outline if the document could be parsed, otherwise `None`.
+
+    Raises:
+        OpmlError: if the document is malformed or invalid.
     """
-    handler = _Handler()
-    xml.sax.parse(fh, handler)
-    return handler.root
+    parser = _TreeParser()
+    parser.feed_file(fh)
+    return parser.root
 
 
-def parse_string(s: str) -> Outline | None:
+def parse_string(s: str | bytes | bytearray | memoryview | mmap.mmap) -> Outline | None:
     """Parses an OPML document from the given string.
 
     Args:
-        s: an OPML document.
+        s: an OPML document; as well as a string, this can be a bytestring or
+            any other buffer, such as a memory-mapped file
 
     Returns:
         An outline if the document could be parsed, otherwise `None`.
+
+    Raises:
+        OpmlError: if the document is malformed or invalid.
+    """
+    parser = _TreeParser()
+    parser.feed_buffer(s)
+    return parser.root
+
+
+def write(
+    outlines: Outline | t.Iterable[Outline],
+    fh: t.IO,
+    *,
+    head: t.Mapping[str, str | datetime.datetime] | None = None,
+    encoding: str = "utf-8",
+) -> None:
+    """Write an OPML document to the given file object.
+
+    Outlines are written out as they're iterated over, so if they come from a
+    generator, only one top-level outline (and its children) need be in memory
+    at a time.
+
+    Args:
+        outlines: either a root outline, whose attributes are used as the
+            document's head metadata if `head` isn't given, the top-level
+            outlines of the document, or a single non-root outline to write
+            as the only top-level outline
+        fh: a file-like object to write the document to, opened in either
+            text or binary mode
+        head: the document's head metadata; datetimes, such as those for
+            `dateCreated` and `dateModified`, are written in RFC 2822 format
+        encoding: the text encoding to use for the document
+    """
+    if head is None:
+        head = outlines.attrs if isinstance(outlines, Outline) and outlines.root else {}
+    xml = XMLBuilder(fh, encoding)
+    with xml.within("opml", version="2.0"):
+        with xml.within("head"):
+            for name, value in head.items():
+                if isinstance(value, datetime.datetime):
+                    value = email.utils.format_datetime(value)
+                xml.tag(name, value)
+        with xml.within("body"):
+            _write_outlines(xml, (outlines,) if isinstance(outlines, Outline) and not outlines.root else outlines)
+
+
+def _write_outlines(xml: XMLBuilder, outlines: t.Iterable[Outline]) -> None:
+    # As with _walk, this is iterative so deep nesting can't hit the
+    # recursion limit.
+    stack = [iter(outlines)]
+    while stack:
+        for outline in stack[-1]:
+            # Only the attributes actually present are written, not the defaults.
+            attrs = _own_attrs(outline.attrs)
+            if len(outline) == 0:
+                xml.tag("outline", **attrs)
+            else:
+                xml.generator.startElement("outline", attrs)  # type: ignore
+                stack.append(iter(outline))
+                break
+        else:
+            stack.pop()
+            if stack:
+                xml.generator.endElement("outline")
+
+
+# The path of an outline: the titles of the outlines it's nested within.
+Path = tuple[str, ...]
+
+
+@dataclasses.dataclass
+class OutlineDiff:
+    """The differences between the feeds in two outlines.
+
+    Attributes:
+        added: the paths and outlines of feeds only in the second outline
+        removed: the paths and outlines of feeds only in the first outline
+        moved: the old paths, new paths, and outlines of feeds in both
+            outlines, but at different paths
+    """
+
+    added: list[tuple[Path, Outline]] = dataclasses.field(default_factory=list)
+    removed: list[tuple[Path, Outline]] = dataclasses.field(default_factory=list)
+    moved: list[tuple[Path, Path, Outline]] = dataclasses.field(default_factory=list)
+
+
+def _normalise_url(url: str) -> str:
+    """Normalise a URL enough that trivially different forms compare equal."""
+    parts = urlparse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    return urlparse.urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def _feed_key(attrs: t.Mapping[str, str]) -> str | None:
+    # Empty URLs would all normalise to "/", so are treated as missing.
+    url = attrs.get("xmlUrl", "").strip() or attrs.get("htmlUrl", "").strip()
+    return _normalise_url(url) if url else None
+
+
+def _walk(root: Outline) -> t.Iterator[tuple[Path, Outline]]:
+    """Walk the outlines beneath `root` in document order, with their paths."""
+    stack: list[tuple[Path, t.Iterator[Outline]]] = [((), iter(root))]
+    while stack:
+        path, children = stack[-1]
+        for child in children:
+            yield path, child
+            if len(child) > 0:
+                stack.append(((*path, _title(child.attrs)), iter(child)))
+                break
+        else:
+            stack.pop()
+
+
+def index_feeds(outline: Outline) -> dict[str, tuple[Path, Outline]]:
+    """Index the feeds within an outline by URL.
+
+    Feeds are keyed on a normalised form of their `xmlUrl` attribute, or their
+    `htmlUrl` attribute if they have no `xmlUrl`; outlines where both are
+    missing or empty aren't indexed. If the same feed appears more than once,
+    only the first occurrence is indexed.
+
+    Args:
+        outline: the outline to index
+
+    Returns:
+        A mapping of normalised URLs to the path of each feed and its outline.
+    """
+    result: dict[str, tuple[Path, Outline]] = {}
+    for path, child in _walk(outline):
+        key = _feed_key(child.attrs)
+        if key is not None and key not in result:
+            result[key] = (path, child)
+    return result
+
+
+def diff(a: Outline, b: Outline) -> OutlineDiff:
+    """Compare the feeds within two outlines.
+
+    Feeds are matched up as with [adjunct.opml.index_feeds][], so this runs
+    in linear time.
+
+    Args:
+        a: the original outline
+        b: the updated outline
+
+    Returns:
+        The feeds added, removed, and moved between the two outlines.
+    """
+    index_a = index_feeds(a)
+    index_b = index_feeds(b)
+    result = OutlineDiff()
+    for key, (path, outline) in index_b.items():
+        if key not in index_a:
+            result.added.append((path, outline))
+        elif index_a[key][0] != path:
+            result.moved.append((index_a[key][0], path, outline))
+    result.removed.extend(entry for key, entry in index_a.items() if key not in index_b)
+    return result
+
+
+def merge(a: Outline, b: Outline) -> Outline:
+    """Merge the feeds from one outline into a copy of another.
+
+    Feeds in `b` that aren't in `a` are added to the copy, in a folder with the
+    same path as in `b`; any folders that don't exist yet are created. Feeds
+    are matched up as with [adjunct.opml.index_feeds][], so this runs in
+    linear time.
+
+    Args:
+        a: the outline to merge into; it isn't modified
+        b: the outline with the feeds to merge
+
+    Returns:
+        The merged outline.
     """
-    handler = _Handler()
-    xml.sax.parseString(s, handler)
-    return handler.root
+    result = _copy(a)
+    folders: dict[Path, Outline] = {(): result}
+    known = set()
+    for path, child in _walk(result):
+        key = _feed_key(child.attrs)
+        if key is None or len(child) > 0:
+            folders.setdefault((*path, _title(child.attrs)), child)
+        if key is not None:
+            known.add(key)
+    for key, (path, outline) in index_feeds(b).items():
+        if key not in known:
+            _get_folder(folders, path).append(Outline(outline.attrs.copy()))
+    return result
+
+
+def _copy(outline: Outline) -> Outline:
+    """Copy an outline and everything nested within it."""
+    result = Outline(outline.attrs.copy(), root=outline.root)
+    # As with _walk, this is iterative so deep nesting can't hit the
+    # recursion limit.
+    stack = [(result, iter(outline))]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            copied = Outline(child.attrs.copy())
+            parent.append(copied)
+            if len(child) > 0:
+                stack.append((copied, iter(child)))
+                break
+        else:
+            stack.pop()
+    return result
+
+
+def _get_folder(folders: dict[Path, Outline], path: Path) -> Outline:
+    """Find the folder with the given path, creating it if needed."""
+    folder = folders.get(path)
+    if folder is None:
+        folder = Outline({"text": path[-1]})
+        _get_folder(folders, path[:-1]).append(folder)
+        folders[path] = folder
+    return folder
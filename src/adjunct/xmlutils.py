@@ -1,9 +1,218 @@
 """XML utilities."""
 
+import codecs
 import contextlib
+import functools
 import io
+import typing as t
 from xml.sax import saxutils
 
+# How many characters of output the direct engine accumulates before writing
+# them out.
+_FLUSH_THRESHOLD = 65536
+
+# Replacements applied to attribute values beyond those applied to text. These
+# match what `saxutils.quoteattr` does, so both engines produce the same output.
+_ATTR_ESCAPES = (("\n", "&#10;"), ("\r", "&#13;"), ("\t", "&#9;"))
+
+
+def _escape(value: str) -> str:
+    # Chained replacements are several times faster than `str.translate` here,
+    # as translation tables that map characters to strings defeat its fast path.
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    return value
+
+
+def _quote_attr(value: str) -> str:
+    value = _escape(value)
+    for char, replacement in _ATTR_ESCAPES:
+        if char in value:
+            value = value.replace(char, replacement)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"{}"'.format(value.replace('"', "&quot;"))
+
+
+def _start_tag(tag: str, attrs: t.Mapping[str, str]) -> str:
+    if not attrs:
+        return f"<{tag}>"
+    parts = [f"<{tag}"]
+    for name, value in attrs.items():
+        parts.append(f" {name}={_quote_attr(value)}")
+    parts.append(">")
+    return "".join(parts)
+
+
+def _is_text_sink(out: t.Any) -> bool | None:
+    """Is `out` a text stream? Returns `None` if its type doesn't say."""
+    if isinstance(out, io.TextIOBase | codecs.StreamWriter | codecs.StreamReaderWriter):
+        return True
+    if isinstance(out, io.RawIOBase | io.BufferedIOBase):
+        return False
+    mode = getattr(out, "mode", None)
+    if isinstance(mode, str):
+        return "b" not in mode
+    return None
+
+
+class _DirectGenerator:
+    """A stand-in for `XMLGenerator` that builds the markup itself.
+
+    Rather than writing each piece as it's generated, output is accumulated
+    and written out in batches. If the sink isn't a text stream, the batches
+    are encoded before being written.
+    """
+
+    def __init__(self, out: t.IO, encoding: str, flush_threshold: int = _FLUSH_THRESHOLD) -> None:
+        self._out = out
+        self._encoding = encoding
+        self._text = _is_text_sink(out)
+        # An incremental encoder only writes a BOM, for those encodings that
+        # have one, at the very start of the output rather than every batch.
+        self._encoder = codecs.getincrementalencoder(encoding)("xmlcharrefreplace")
+        self._pending: list[str] = []
+        self._size = 0
+        self._flush_threshold = flush_threshold
+
+    def write(self, markup: str) -> None:
+        self._pending.append(markup)
+        self._size += len(markup)
+        if self._size >= self._flush_threshold:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        data = "".join(self._pending)
+        self._pending.clear()
+        self._size = 0
+        if self._text is None:
+            # Nothing about the sink says what it accepts, so try text first.
+            try:
+                self._out.write(data)
+            except TypeError:
+                self._text = False
+            else:
+                self._text = True
+                return
+        self._out.write(data if self._text else self._encoder.encode(data))
+
+    def startDocument(self) -> None:  # noqa: N802
+        self.write(f'<?xml version="1.0" encoding="{self._encoding}"?>\n')
+
+    def endDocument(self) -> None:  # noqa: N802
+        self.flush()
+
+    def startElement(self, name: str, attrs: t.Mapping[str, str]) -> None:  # noqa: N802
+        self.write(_start_tag(name, attrs))
+
+    def endElement(self, name: str) -> None:  # noqa: N802
+        self.write(f"</{name}>")
+
+    def characters(self, content: str) -> None:
+        self.write(_escape(content))
+
+    def ignorableWhitespace(self, content: str) -> None:  # noqa: N802
+        self.write(content)
+
+
+class Slot(t.NamedTuple):
+    """A placeholder in a [adjunct.xmlutils.RecordTemplate][] for a value from a row.
+
+    Attributes:
+        name: the key to look the value up with in each row
+    """
+
+    name: t.Any
+
+
+def _text_value(value: t.Any) -> str:
+    return "" if value is None else _escape(value if isinstance(value, str) else str(value))
+
+
+def _attr_value(value: t.Any) -> str:
+    return _quote_attr("" if value is None else value if isinstance(value, str) else str(value))
+
+
+class RecordTemplate:
+    """A precompiled element structure for writing many records with.
+
+    The static markup is rendered once, up front, so rendering a record only
+    involves escaping the values that go into its slots. Values of `None` are
+    rendered as empty strings, and anything else that isn't a string is
+    converted to one.
+
+    Examples:
+        >>> url = RecordTemplate(
+        ...     "url",
+        ...     RecordTemplate("loc", Slot("loc")),
+        ...     RecordTemplate("lastmod", Slot("lastmod")),
+        ... )
+        >>> url.render({"loc": "http://example.com/", "lastmod": "2024-01-01"})
+        '<url><loc>http://example.com/</loc><lastmod>2024-01-01</lastmod></url>'
+
+    Args:
+        tag: the tag name
+        children: the element's content, made up of literal text, slots, and
+            nested templates
+        attrs: the element's attributes, with either literal or slot values
+    """
+
+    __slots__ = ("_format", "_slots")
+
+    def __init__(self, tag: str, /, *children: "str | Slot | RecordTemplate", **attrs: str | Slot) -> None:
+        parts: list[str] = []
+        self._slots: list[tuple[t.Any, t.Callable[[t.Any], str]]] = []
+        self._compile(tag, children, attrs, parts)
+        self._format = "".join(parts)
+
+    def _compile(
+        self,
+        tag: str,
+        children: "t.Iterable[str | Slot | RecordTemplate]",
+        attrs: t.Mapping[str, str | Slot],
+        parts: list[str],
+    ) -> None:
+        # Everything's rendered into a %-format string, so literal percent
+        # signs need to be escaped.
+        parts.append(f"<{tag}")
+        for name, value in attrs.items():
+            if isinstance(value, Slot):
+                parts.append(f" {name}=%s")
+                self._slots.append((value.name, _attr_value))
+            else:
+                parts.append(" {}={}".format(name, _quote_attr(value).replace("%", "%%")))
+        parts.append(">")
+        for child in children:
+            if isinstance(child, Slot):
+                parts.append("%s")
+                self._slots.append((child.name, _text_value))
+            elif isinstance(child, RecordTemplate):
+                parts.append(child._format)
+                self._slots.extend(child._slots)
+            else:
+                parts.append(_escape(child).replace("%", "%%"))
+        parts.append(f"</{tag}>")
+
+    def render(self, row: t.Any) -> str:
+        """Render a record.
+
+        Args:
+            row: a mapping (or sequence, if the slots are named by index) of
+                values for the slots
+
+        Returns:
+            The rendered markup.
+        """
+        return self._format % tuple(fn(row[name]) for name, fn in self._slots)
+
 
 class XMLBuilder:
     """An XML document builder.
@@ -26,22 +235,47 @@ class XMLBuilder:
     Args:
         out: a file-like object to write the document to; if none is provided,
             a buffer is created.
+        encoding: the encoding to declare for the document
+        direct: if true, generate the markup directly rather than going
+            through `xml.sax.saxutils.XMLGenerator`; this is considerably
+            faster, but output is written in batches, so call `flush()` or
+            `close()` when done
+        flush_threshold: with the direct engine, the number of characters
+            of output to accumulate before writing them to `out`
+
+    If `out` is a text stream, the document is written to it as is;
+    otherwise, it's treated as a binary sink, and the document is encoded
+    before being written to it. With the direct engine, a sink that isn't an
+    `io` or `codecs` stream and has no `mode` attribute is treated as a text
+    stream unless writing text to it raises `TypeError`.
 
     Note:
         If you provide your own, the `as_string()` method will return an empty
         string as no other sensible value can be returned.
     """
 
-    def __init__(self, out: io.TextIOBase | None = None, encoding: str = "utf-8") -> None:
+    def __init__(
+        self,
+        out: t.IO | None = None,
+        encoding: str = "utf-8",
+        *,
+        direct: bool = False,
+        flush_threshold: int = _FLUSH_THRESHOLD,
+    ) -> None:
         self.buffer = None
         if out is None:
             self.buffer = io.StringIO()
             out = self.buffer
-        self.generator = saxutils.XMLGenerator(out, encoding)
+        self._direct = direct
+        self.generator: saxutils.XMLGenerator | _DirectGenerator
+        if direct:
+            self.generator = _DirectGenerator(out, encoding, flush_threshold)  # type: ignore
+        else:
+            self.generator = saxutils.XMLGenerator(out, encoding)
         self.generator.startDocument()
 
     @contextlib.contextmanager
-    def within(self, tag: str, **attrs: str):
+    def within(self, tag: str, /, **attrs: str):
         """Generates an element containing nested elements.
 
         Args:
@@ -52,7 +286,7 @@ class XMLBuilder:
         yield
         self.generator.endElement(tag)
 
-    def tag(self, tag: str, *values: str, **attrs: str) -> None:
+    def tag(self, tag: str, /, *values: str, **attrs: str) -> None:
         """Generates a simple element.
 
         Args:
@@ -60,13 +294,39 @@ class XMLBuilder:
             values: any character data to write between the start and end tag
             attrs: any attributes to add to the tag
         """
+        if self._direct:
+            # Write the whole element in one go.
+            text = _escape(values[0]) if len(values) == 1 else "".join(map(_escape, values))
+            self.generator.write(f"{_start_tag(tag, attrs)}{text}</{tag}>")  # type: ignore
+            return
         self.generator.startElement(tag, attrs)  # type: ignore
         for value in values:
             self.generator.characters(value)
         self.generator.endElement(tag)
 
     def __getattr__(self, tag: str):
-        return lambda *values, **attrs: self.tag(tag, *values, **attrs)
+        fn = functools.partial(self.tag, tag)
+        if not tag.startswith("__"):
+            # Cache it so later lookups don't come through here.
+            self.__dict__[tag] = fn
+        return fn
+
+    def emit_many(self, template: RecordTemplate, rows: t.Iterable[t.Any]) -> None:
+        """Write a record for each of the given rows.
+
+        This is much faster than building each record with `within()` and
+        `tag()`, as only the values need escaping.
+
+        Args:
+            template: the template to render each row with
+            rows: the values for the template's slots, one row per record
+        """
+        render = template.render
+        # The markup's already escaped, and ignorableWhitespace() is the only
+        # way to write raw output through XMLGenerator.
+        write = self.generator.write if self._direct else self.generator.ignorableWhitespace  # type: ignore
+        for row in rows:
+            write(render(row))
 
     def append(self, other: str) -> "XMLBuilder":
         """Append the string to this document.
@@ -77,12 +337,21 @@ class XMLBuilder:
         self.generator.characters(other)
         return self
 
+    def flush(self) -> None:
+        """Write out any output that's waiting to be written."""
+        if self._direct:
+            self.generator.flush()  # type: ignore
+
     def as_string(self) -> str:
         """If using the built-in buffer, get its current contents."""
-        return "" if self.buffer is None else self.buffer.getvalue()
+        if self.buffer is None:
+            return ""
+        self.flush()
+        return self.buffer.getvalue()
 
     def close(self) -> None:
-        """If using the built-in buffer, clean it up."""
+        """Write out any pending output and, if using the built-in buffer, clean it up."""
+        self.flush()
         if self.buffer is not None:
             self.buffer.close()
             self.buffer = None
@@ -90,3 +359,55 @@ class XMLBuilder:
     # Shortcuts.
     __iadd__ = append
     __str__ = as_string
+
+
+def stream(
+    build: t.Callable[[XMLBuilder], t.Iterable[t.Any] | None],
+    encoding: str = "utf-8",
+    flush_threshold: int = _FLUSH_THRESHOLD,
+) -> t.Iterator[bytes]:
+    """Generate an XML document in encoded chunks, such as for a WSGI response.
+
+    The document is built by calling `build` with an [adjunct.xmlutils.XMLBuilder][]
+    using the direct engine. If `build` is a generator function, any output
+    ready to go is yielded each time it yields, so the whole document need
+    never be held in memory.
+
+    Examples:
+        >>> def build(xml):
+        ...     with xml.within("urlset"):
+        ...         for url in urls:
+        ...             with xml.within("url"):
+        ...                 xml.loc(url)
+        ...             yield
+        >>> def app(environ, start_response):
+        ...     start_response("200 OK", [("Content-Type", "application/xml")])
+        ...     return stream(build)
+
+    Args:
+        build: a callable (ideally, a generator function) that writes the
+            document to the builder it's passed
+        encoding: the encoding to use for the document
+        flush_threshold: the number of characters of output to accumulate
+            before yielding them
+
+    Returns:
+        An iterator over the encoded document.
+    """
+    sink = io.BytesIO()
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    xml = XMLBuilder(sink, encoding, direct=True, flush_threshold=flush_threshold)
+    steps = build(xml)
+    if steps is not None:
+        for _ in steps:
+            if sink.tell() > 0:
+                yield drain()
+    xml.close()
+    if sink.tell() > 0:
+        yield drain()
@@ -1,3 +1,5 @@
+import timeit
+
 import pytest
 
 from adjunct import fixtureutils
@@ -66,3 +68,19 @@ def app(environ, start_response):
 def fixture_app():
     with fixtureutils.fixture(app) as addr:
         yield addr
+
+
+@pytest.fixture
+def best_of(request, record_testsuite_property):
+    """Time a callable, returning its best time over a number of runs.
+
+    Timings are recorded in the JUnit report rather than asserted on, as
+    wall-clock comparisons are too noisy on shared CI runners.
+    """
+
+    def best_of(name, fn, repeat=5):
+        timing = min(timeit.repeat(fn, number=1, repeat=repeat))
+        record_testsuite_property(f"{request.node.name}[{name}]", f"{timing:.6f}")
+        return timing
+
+    return best_of
@@ -1,5 +1,7 @@
 import io
 
+import pytest
+
 from adjunct import discovery
 
 
@@ -77,3 +79,38 @@ def test_fix_attributes():
         "type": "text/html",
         "title": "Preserve Case",
     }
+
+
+def test_pack_meta_round_trip():
+    links = [
+        {"href": "http://example.com/feed", "rel": "alternate", "type": "application/atom+xml"},
+        {"href": "http://example.com/", "rel": "canonical"},
+    ]
+    properties = [("og:title", "Example"), ("og:image", "http://example.com/a.png"), ("og:title", "Again")]
+    packed = discovery.pack_meta(links, properties)
+    # Each attribute and property name should only be stored once.
+    assert packed.count(b'"href"') == 1
+    assert packed.count(b'"og:title"') == 1
+    assert discovery.unpack_meta(packed) == (links, properties)
+
+
+def test_unpack_meta_rejects_other_versions():
+    with pytest.raises(ValueError, match="version"):
+        discovery.unpack_meta(b"[99,[],[],[]]")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"not json",
+        b"[1,[],7,[]]",
+        b'[1,["href"],[[5,"x"]],[]]',
+        b'[1,["href"],[[0]],[]]',
+        b'[1,["href"],[[0,1]],[]]',
+        b'[1,["og:title"],[],[[-1,"x"]]]',
+        b'[1,["og:title"],[],[[0,"x","y"]]]',
+    ],
+)
+def test_unpack_meta_rejects_malformed_contents(data):
+    with pytest.raises(ValueError, match="Malformed"):
+        discovery.unpack_meta(data)
@@ -0,0 +1,144 @@
+import dataclasses
+import datetime
+import io
+import sqlite3
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from adjunct import dbhelpers, feeds
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+
+FEED = feeds.Feed(title="Example", link="http://example.com/", author="Jane Doe")
+
+
+@pytest.fixture
+def tmp_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "fixture.db")
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE entries (
+            id      INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            title   TEXT NOT NULL,
+            link    TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            content TEXT
+        )
+        """)
+    conn.executemany(
+        "INSERT INTO entries (title, link, updated, content) VALUES (?, ?, ?, ?)",
+        [
+            ("First", "http://example.com/1", "2024-01-01 09:00:00", None),
+            ("Tom & Jerry", "http://example.com/2?a=1&b=2", "2024-02-01 10:30:00", "<p>Hello</p>"),
+        ],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _entries(conn):
+    return dbhelpers.query(conn, "SELECT * FROM entries ORDER BY updated DESC")
+
+
+def test_write_atom(tmp_db):
+    buf = io.BytesIO()
+    feeds.write_atom(FEED, _entries(tmp_db), buf)
+    root = ET.fromstring(buf.getvalue())  # noqa: S314
+    assert root.tag == f"{ATOM}feed"
+    assert root.findtext(f"{ATOM}id") == "http://example.com/"
+    # The feed's timestamp is taken from the most recent entry.
+    assert root.findtext(f"{ATOM}updated") == "2024-02-01T10:30:00+00:00"
+    assert root.findtext(f"{ATOM}author/{ATOM}name") == "Jane Doe"
+
+    entries = root.findall(f"{ATOM}entry")
+    assert [entry.findtext(f"{ATOM}title") for entry in entries] == ["Tom & Jerry", "First"]
+    assert entries[0].findtext(f"{ATOM}id") == "2"
+    assert entries[0].find(f"{ATOM}link").get("href") == "http://example.com/2?a=1&b=2"
+    assert entries[0].find(f"{ATOM}content").get("type") == "html"
+    assert entries[0].findtext(f"{ATOM}content") == "<p>Hello</p>"
+    assert entries[1].find(f"{ATOM}content") is None
+
+
+def test_write_rss(tmp_db):
+    buf = io.StringIO()
+    feeds.write_rss(FEED, _entries(tmp_db), buf)
+    channel = ET.fromstring(buf.getvalue()).find("channel")  # noqa: S314
+    assert channel.findtext("title") == "Example"
+    assert channel.findtext("lastBuildDate") == "Thu, 01 Feb 2024 10:30:00 +0000"
+    items = channel.findall("item")
+    assert [item.findtext("pubDate") for item in items] == [
+        "Thu, 01 Feb 2024 10:30:00 +0000",
+        "Mon, 01 Jan 2024 09:00:00 +0000",
+    ]
+    assert items[0].find("guid").get("isPermaLink") == "false"
+    assert items[0].findtext("description") == "<p>Hello</p>"
+
+
+def test_rss_author():
+    row = {"title": "Post", "link": "http://example.com/p", "updated": "2024-01-01 09:00:00", "author": "Jane Doe"}
+    buf = io.StringIO()
+    feeds.write_rss(FEED, [row], buf)
+    item = ET.fromstring(buf.getvalue()).find("channel/item")  # noqa: S314
+    assert item.find("author") is None
+    assert item.findtext(f"{DC}creator") == "Jane Doe"
+
+
+def test_empty_feed():
+    buf = io.StringIO()
+    feeds.write_atom(FEED, [], buf)
+    root = ET.fromstring(buf.getvalue())  # noqa: S314
+    # Atom requires a timestamp, so the current time is used.
+    updated = datetime.datetime.fromisoformat(root.findtext(f"{ATOM}updated"))
+    assert abs(datetime.datetime.now(datetime.UTC) - updated) < datetime.timedelta(minutes=1)
+    assert root.find(f"{ATOM}entry") is None
+
+    buf = io.StringIO()
+    feeds.write_atom(dataclasses.replace(FEED, updated="2024-03-01 12:00:00"), [], buf)
+    root = ET.fromstring(buf.getvalue())  # noqa: S314
+    assert root.findtext(f"{ATOM}updated") == "2024-03-01T12:00:00+00:00"
+
+
+def test_stream_matches_write(tmp_db):
+    buf = io.BytesIO()
+    feeds.write_atom(FEED, _entries(tmp_db), buf)
+    assert b"".join(feeds.stream_atom(FEED, _entries(tmp_db))) == buf.getvalue()
+
+    buf = io.BytesIO()
+    feeds.write_rss(FEED, _entries(tmp_db), buf)
+    assert b"".join(feeds.stream_rss(FEED, _entries(tmp_db))) == buf.getvalue()
+
+
+def test_stream_is_lazy():
+    consumed = []
+
+    def rows():
+        for i in range(2000):
+            consumed.append(i)
+            yield {"id": i, "title": f"Entry {i}", "updated": "2024-01-01 00:00:00"}
+
+    chunks = feeds.stream_atom(FEED, rows())
+    next(chunks)
+    assert 0 < len(consumed) < 2000
+
+
+def test_weak_etag(tmp_db):
+    etag = feeds.weak_etag(dbhelpers.query(tmp_db, "SELECT id, updated FROM entries ORDER BY updated DESC"))
+    assert etag.startswith('W/"')
+    assert etag == feeds.weak_etag(_entries(tmp_db))
+
+    tmp_db.execute("UPDATE entries SET updated = '2024-03-01 00:00:00' WHERE id = 1")
+    assert etag != feeds.weak_etag(_entries(tmp_db))
+
+
+def test_etag_matches():
+    etag = 'W/"abc"'
+    assert feeds.etag_matches(etag, 'W/"abc"')
+    assert feeds.etag_matches(etag, '"abc"')
+    assert feeds.etag_matches(etag, '"xyz", W/"abc"')
+    assert feeds.etag_matches(etag, "*")
+    assert not feeds.etag_matches(etag, '"xyz"')
+    assert not feeds.etag_matches(etag, None)
+    assert not feeds.etag_matches(etag, "")
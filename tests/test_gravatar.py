@@ -0,0 +1,13 @@
+from adjunct import gravatar
+
+DIGEST = "321ba197033e81286fedb719d60d4ed5cecaed170733cb4a92013811afc0e3b6"
+
+
+def test_make_gravatar():
+    assert gravatar.make_gravatar(" Foo@Example.com ") == f"//www.gravatar.com/avatar/{DIGEST}?s=64&d=identicon&r=pg"
+
+
+def test_make_gravatar_img():
+    assert gravatar.make_gravatar_img("foo@example.com", size=32, default="retro", rating="g") == (
+        f'<img src="//www.gravatar.com/avatar/{DIGEST}?s=32&amp;d=retro&amp;r=g" width="32" height="32" alt="">'
+    )
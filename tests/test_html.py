@@ -1,4 +1,9 @@
+import codecs
+import dataclasses
+import gc
 import io
+import tracemalloc
+from urllib.parse import urljoin
 
 import pytest
 
@@ -65,6 +70,27 @@ def test_serialisation(src, length, expected):
         assert fh.getvalue() == expected
 
 
+def test_end_tag_closes_innermost_match():
+    # Text after a closed inline element stays in the enclosing element.
+    root = html.parse("<p><a>x</a>y</p>")
+    assert root == html.Element(None, children=[html.Element("p", children=[html.Element("a", children=["x"]), "y"])])
+
+    # Elements left open within the closed one are closed along with it.
+    root = html.parse("<div><p><b>x</p>y</div>z")
+    assert root == html.Element(
+        None,
+        children=[
+            html.Element("div", children=[html.Element("p", children=[html.Element("b", children=["x"])]), "y"]),
+            "z",
+        ],
+    )
+
+
+def test_stray_end_tag_is_ignored():
+    root = html.parse("<p>x</b>y</p>")
+    assert root == html.Element(None, children=[html.Element("p", children=["xy"])])
+
+
 def test_no_file_object_serialiser():
     expected = "<br>"
     fo = html.parse(expected).serialize()
@@ -77,3 +103,497 @@ def test_make_html():
     assert html.make("a", attrs={"href": "foo"}) == '<a href="foo"></a>'
     assert html.make("a", attrs={"href": "foo"}, close=False) == '<a href="foo">'
     assert html.make("input", attrs={"type": "checkbox", "disabled": None}) == '<input type="checkbox" disabled>'
+
+
+def test_compact_attrs():
+    root = html.parse('<a href="foo" name>bar</a><br>')
+    link, br = root
+    assert link.get("href") == "foo"
+    assert link.get("name") is None
+    assert link.get("missing", "default") == "default"
+    assert br.attrs == {}
+    link.attrs["href"] = "baz"
+    assert link.get("href") == "baz"
+    assert root.serialize().getvalue() == '<a href="baz" name>bar</a><br>'
+
+
+def test_duplicate_attrs():
+    root = html.parse('<a href="foo" href="bar">')
+    assert root[0].get("href") == "bar"
+    assert root[0].attrs == {"href": "bar"}
+
+
+def test_element_equality():
+    assert html.parse('<a href="foo">bar</a>')[0] == html.Element("a", {"href": "foo"}, ["bar"])
+    assert html.parse('<a href="foo">bar</a>')[0] != html.Element("a", {"href": "baz"}, ["bar"])
+
+
+@dataclasses.dataclass
+class _LegacyElement:
+    """The dataclass-based element used prior to the slotted implementation."""
+
+    tag: str | None
+    attrs: dict = dataclasses.field(default_factory=dict)
+    children: list = dataclasses.field(default_factory=list)
+
+
+class _LegacyParser(html._Parser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.root = _LegacyElement(tag=None)
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs) -> None:
+        elem = _LegacyElement(tag=tag, attrs=dict(attrs))
+        self.top.children.append(elem)
+        if tag not in html._SELF_CLOSING:
+            self.stack.append(elem)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self.top.children.append(_LegacyElement(tag=tag, attrs=dict(attrs)))
+
+
+def _legacy_parse(markup):
+    parser = _LegacyParser()
+    parser.feed(markup)
+    parser.close()
+    return parser.root
+
+
+def _retained_memory(parse, markup):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        root = parse(markup)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(root.children) > 0
+    return size
+
+
+@pytest.mark.slow
+def test_memory_benchmark():
+    markup = "".join(
+        f'<div class="row"><a href="/item/{i}" class="link">item</a><br><img src="i.png" alt=""></div>'
+        for i in range(20000)
+    )
+    compact = _retained_memory(html.parse, markup)
+    legacy = _retained_memory(_legacy_parse, markup)
+    print(f"compact: {compact} bytes; legacy: {legacy} bytes; saved {100 * (1 - compact / legacy):.1f}%")
+    assert compact < legacy * 0.8
+
+
+def test_deep_nesting_serialisation():
+    depth = 5000
+    root = html.Element(tag=None)
+    elem = root
+    for _ in range(depth):
+        child = html.Element("b")
+        elem.children.append(child)
+        elem = child
+    elem.children.append("x")
+    assert root.serialize().getvalue() == "<b>" * depth + "x" + "</b>" * depth
+
+
+def test_chunked_serialisation():
+    root = html.parse("<p>" + "<i>a</i>" * 100 + "</p>")
+    chunks = list(root.iter_serialized(chunk_size=64))
+    assert len(chunks) > 1
+    assert "".join(chunks) == root.serialize().getvalue()
+
+
+def test_binary_serialisation():
+    root = html.parse('<p title="café">☃</p>')
+    assert root.serialize(encoding="utf-8").getvalue() == '<p title="café">☃</p>'.encode()
+    with io.BytesIO() as fh:
+        root.serialize(fh, encoding="ascii")
+        assert fh.getvalue() == b'<p title="caf&#233;">&#9731;</p>'
+
+
+SELECTOR_DOC = """
+<div id="main" class="content wide">
+  <p class="intro">Hello <a href="/one" class="external">one</a></p>
+  <ul>
+    <li><a href="/two">two</a></li>
+    <li class="intro"><a name="anchor">three</a></li>
+  </ul>
+</div>
+<p><a href="/four">four</a></p>
+"""
+
+
+@pytest.mark.parametrize(
+    ("selector", "expected"),
+    [
+        ("a", ["one", "two", "three", "four"]),
+        ("*", ["div", "p", "a", "ul", "li", "a", "li", "a", "p", "a"]),
+        ("#main a", ["one", "two", "three"]),
+        (".intro", ["p", "li"]),
+        ("div.content.wide > p > a", ["one"]),
+        ("div > a", []),
+        ("ul a", ["two", "three"]),
+        ("li.intro a", ["three"]),
+        ("a[href]", ["one", "two", "four"]),
+        ("a[href='/two']", ["two"]),
+        ('a[href="/four"]', ["four"]),
+        ("a[name=anchor]", ["three"]),
+        ("#main li > a", ["two", "three"]),
+        ("div p a", ["one"]),
+        ("#missing", []),
+    ],
+)
+def test_select(selector, expected):
+    root = html.parse(SELECTOR_DOC)
+    found = [elem[0] if elem.tag == "a" and selector != "*" else elem.tag for elem in root.select(selector)]
+    assert found == expected
+    # Elements other than the root are searched without an index.
+    body = html.Element("body", children=root.children)
+    assert list(body.select(selector)) == list(root.select(selector))
+
+
+def test_select_one():
+    root = html.parse(SELECTOR_DOC)
+    assert root.select_one("ul > li")[0].get("href") == "/two"
+    assert root.select_one("table") is None
+
+
+def test_select_reset_index():
+    root = html.parse("<p></p>")
+    assert list(root.select("a")) == []
+    root[0].children.append(html.Element("a"))
+    assert list(root.select("a")) == []
+    root.reset_index()
+    assert len(list(root.select("a"))) == 1
+
+
+def test_select_subtree():
+    root = html.parse(SELECTOR_DOC)
+    ul = root.select_one("ul")
+    assert ul is not None
+    assert [elem[0] for elem in ul.select("a")] == ["two", "three"]
+    # Only the elements beneath the subtree are considered.
+    assert list(ul.select("div a")) == []
+
+
+@pytest.mark.parametrize("selector", [".foo a", "p span.x b"])
+def test_select_valid_no_match(selector):
+    root = html.parse(SELECTOR_DOC)
+    assert list(root.select(selector)) == []
+
+
+@pytest.mark.parametrize("selector", ["", "> a", "a >", "a#", "a[", "a.b c#", "a > > b"])
+def test_select_invalid(selector):
+    root = html.parse(SELECTOR_DOC)
+    with pytest.raises(ValueError, match="Invalid selector"):
+        list(root.select(selector))
+
+
+def test_descendants():
+    root = html.parse(SELECTOR_DOC)
+    assert [elem.tag for elem in root.descendants("li")] == ["li", "li"]
+    assert len(list(root.descendants())) == 10
+
+
+def _describe(events):
+    return [(event, payload if event == "text" else payload.tag) for event, payload in events]
+
+
+def test_iterparse_events():
+    events = html.iterparse("<p>a<br>b<i>c</p>d")
+    assert _describe(events) == [
+        ("start", "p"),
+        ("text", "a"),
+        ("start", "br"),
+        ("end", "br"),
+        ("text", "b"),
+        ("start", "i"),
+        ("text", "c"),
+        ("end", "i"),
+        ("end", "p"),
+        ("text", "d"),
+    ]
+
+
+def test_iterparse_closes_open_elements():
+    assert _describe(html.iterparse("<div><p>x")) == [
+        ("start", "div"),
+        ("start", "p"),
+        ("text", "x"),
+        ("end", "p"),
+        ("end", "div"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        '<p title="café">x<b>☃</b></p>',
+        '<p title="café">x<b>☃</b></p>'.encode(),
+        io.StringIO('<p title="café">x<b>☃</b></p>'),
+        io.BytesIO('<p title="café">x<b>☃</b></p>'.encode()),
+        ["<p title=", '"café">x<b>', "☃</b></p>"],
+        [b"<p title=", b'"caf\xc3', b'\xa9">x<b>\xe2\x98', b"\x83</b></p>"],
+    ],
+)
+def test_iterparse_sources(source):
+    events = html.iterparse(source, chunk_size=3)
+    event, elem = next(events)
+    assert event == "start"
+    assert elem.get("title") == "café"
+    assert events.materialize(elem) == html.parse('<p title="café">x<b>☃</b></p>')[0]
+    assert list(events) == []
+
+
+def test_iterparse_materialize():
+    events = html.iterparse('<ul><li><a href="/a">A</a></li><li><a href="/b">B</a></li></ul><p>after</p>')
+    found = [events.materialize(elem) for event, elem in events if event == "start" and elem.tag == "li"]
+    assert [elem.serialize().getvalue() for elem in found] == [
+        '<li><a href="/a">A</a></li>',
+        '<li><a href="/b">B</a></li>',
+    ]
+
+
+def test_rewriter():
+    rewriter = html.Rewriter()
+    rewriter.attribute("href", lambda _tag, name, value: (name, urljoin("http://example.com/a/", value)))
+    rewriter.attribute("src", lambda _tag, name, value: (name, urljoin("http://example.com/a/", value)))
+    rewriter.attribute(None, lambda _tag, name, value: None if name.startswith("on") else (name, value))
+    rewriter.element("a", lambda _tag, attrs: attrs.__setitem__("rel", "nofollow"))
+    src = '<p onclick="x()">1 &lt; 2 <a href="b" rel="me">link</a><img src="/c.png" onerror="y()"/><br/><div/></p>'
+    assert rewriter.rewrite(src).getvalue() == (
+        '<p>1 &lt; 2 <a href="http://example.com/a/b" rel="nofollow">link</a>'
+        '<img src="http://example.com/c.png"><br><div></div></p>'
+    )
+
+
+@pytest.mark.parametrize(
+    "src",
+    [
+        "<p><a>x</a>y</p>",
+        "<p>x</b>y<div>",
+        "<div><p><b>x</p>y</div>z</i>",
+        "<ul><li>a<li>b</ul><br></br><img/><span/>",
+        '<a href="/x?a=1&amp;b=2" title="&quot;q&quot;">1 &lt; 2 &amp; 3</a>',
+    ],
+)
+def test_rewriter_matches_parse(src):
+    assert html.Rewriter().rewrite(src).getvalue() == html.parse(src).serialize().getvalue()
+
+
+def test_rewriter_passes_through_raw_content():
+    src = "<!DOCTYPE html><!-- c --><p>x</b>y<script>a<b && c</script><style>p > a {}</style><div>"
+    assert html.Rewriter().rewrite(src).getvalue() == (
+        "<!DOCTYPE html><!-- c --><p>xy<script>a<b && c</script><style>p > a {}</style><div></div></p>"
+    )
+
+
+def test_rewriter_streams():
+    rewriter = html.Rewriter()
+    rewriter.attribute("class", lambda _tag, _name, _value: None)
+
+    class Recorder(io.StringIO):
+        writes = 0
+
+        def write(self, s):
+            self.writes += 1
+            return super().write(s)
+
+    dest = Recorder()
+    src = '<p class="x">para</p>' * 100
+    rewriter.rewrite(io.StringIO(src), dest, chunk_size=256)
+    assert dest.getvalue() == "<p>para</p>" * 100
+    assert dest.writes > 1
+
+
+COMMENT_POLICY = html.Policy(
+    tags={
+        "a": {"href", "title"},
+        "b": set(),
+        "i": set(),
+        "p": set(),
+        "br": set(),
+    },
+)
+
+
+@pytest.mark.parametrize(
+    ("src", "expected"),
+    [
+        (
+            '<p onclick="x()">Hi <a href="/" style="x" title="t">there</a></p>',
+            '<p>Hi <a href="/" title="t">there</a></p>',
+        ),
+        ("<div><b>bold</b> <font>plain</font></div>", "<b>bold</b> plain"),
+        ("<p>a<script>alert('<p>')</script>b</p>", "<p>ab</p>"),
+        ("<p>a<template><template>x</template>y</template>b</p>", "<p>ab</p>"),
+        ("<b><font>x</font>y</b>z", "<b>xy</b>z"),
+        ("a<script/>b<br/>c", "ab<br>c"),
+    ],
+)
+def test_policy(src, expected):
+    assert html.parse(src, policy=COMMENT_POLICY).serialize().getvalue() == expected
+
+
+def test_policy_never_allocates_disallowed(monkeypatch):
+    tags = []
+
+    def init(self, tag, *args, **kwargs):
+        tags.append(tag)
+        original(self, tag, *args, **kwargs)
+
+    original = html.Element.__init__
+    monkeypatch.setattr(html.Element, "__init__", init)
+    html.parse("<div><b>x</b><span>y</span></div>", policy=COMMENT_POLICY)
+    assert tags == [None, "b"]
+
+
+def test_policy_limits():
+    policy = html.Policy(tags={"b": set()}, max_depth=3, max_nodes=5)
+    assert len(html.parse("<b><b><b>x</b></b></b>", policy=policy)) == 1
+    with pytest.raises(html.LimitExceededError):
+        html.parse("<b><b><b><b>x</b></b></b></b>", policy=policy)
+    with pytest.raises(html.LimitExceededError):
+        html.parse("<b>x</b>" * 3, policy=policy)
+
+
+def test_parse_file():
+    src = '<p title="café">' + "☃<b>x</b>" * 1000 + "</p>"
+    root = html.parse_file(io.BytesIO(src.encode("utf-8")), chunk_size=7)
+    assert root == html.parse(src)
+
+
+def test_parse_file_other_encoding():
+    src = "<p>na\N{LATIN SMALL LETTER I WITH DIAERESIS}ve</p>"
+    assert html.parse_file(io.BytesIO(src.encode("utf-16")), encoding="utf-16", chunk_size=7) == html.parse(src)
+
+
+def test_parse_file_bom_across_chunks():
+    src = "<p>na\N{LATIN SMALL LETTER I WITH DIAERESIS}ve</p>" * 10
+    fh = io.BytesIO(codecs.BOM_UTF16_BE + src.encode("utf-16-be"))
+    assert html.parse_file(fh, encoding="utf-16", chunk_size=5) == html.parse(src)
+
+
+def test_parse_file_truncated():
+    with pytest.raises(UnicodeDecodeError):
+        html.parse_file(io.BytesIO(b"<p>abc\xff"))
+    with pytest.raises(UnicodeDecodeError):
+        html.parse_stream([b"<p>abc\xff"])
+
+
+def test_parse_stream_joins_text():
+    root = html.parse_stream(list("<p>some text</p>tail"))
+    assert root.children == [html.parse("<p>some text</p>")[0], "tail"]
+    assert root[0].children == ["some text"]
+
+
+def test_parse_stream():
+    data = '<p title="café">☃<script>x</script></p>'.encode()
+    chunks = [data[i : i + 3] for i in range(0, len(data), 3)]
+    assert html.parse_stream(chunks, policy=COMMENT_POLICY) == html.parse("<p>☃</p>")
+
+
+@pytest.mark.parametrize(
+    ("src", "limit", "expected"),
+    [
+        ("<p>Hello,\n   <b>world</b>!</p>", None, "Hello, world!"),
+        ("<p>One</p><p>Two</p>Three<br>Four", None, "One Two Three Four"),
+        ("<script>var x = '<p>';</script><style>p {}</style>Text", None, "Text"),
+        ("  <p>  Lots   of   text  </p>  ", None, "Lots of text"),
+        ("<p>Hello, <b>world</b>!</p>", 8, "Hello, w"),
+        ("a &amp; b", None, "a & b"),
+        ("a&nbsp;&nbsp; b", None, "a\N{NO-BREAK SPACE}\N{NO-BREAK SPACE} b"),
+    ],
+)
+def test_extract_text(src, limit, expected):
+    assert html.extract_text(src, limit=limit) == expected
+
+
+def test_extract_text_stops_early():
+    class Reader(io.StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            return super().read(size)
+
+    src = Reader("<p>" + "word " * 100_000 + "</p>")
+    assert html.extract_text(src, limit=20) == "word word word word"
+    assert src.reads == 1
+
+
+@pytest.mark.parametrize(
+    ("src", "chars", "expected"),
+    [
+        ("<p>Hello, <b>world</b>!</p>", 100, "<p>Hello, <b>world</b>!</p>"),
+        ("<p>Hello, <b>world</b>!</p>", 9, "<p>Hello, <b>wo…</b></p>"),
+        ("<p>Hello, <b>world</b>!</p>", 7, "<p>Hello, <b>…</b></p>"),
+        ("<div><p>One <i>two</p> three</div>", 10, "<div><p>One <i>two</i></p> th…</div>"),
+        ('<p><a href="/x">a &lt; b</a><script>x</script><br>tail', 7, '<p><a href="/x">a &lt; b</a><br>t…</p>'),
+        ("<ul><li>One</li>\n\n<li>Two</li></ul>", 5, "<ul><li>One</li>\n\n<li>T…</li></ul>"),
+        ("<p>One</p><p>Two</p>", 5, "<p>One</p><p>T…</p>"),
+        ("<p>One</p><p>Two</p>", 7, "<p>One</p><p>Two</p>"),
+        ("<p>One</p><p>Two</p>", 4, "<p>One</p><p>…</p>"),
+        ("<pre>a  b\n  c</pre>", 100, "<pre>a  b\n  c</pre>"),
+        ("<pre>a  b\n  cd</pre>", 5, "<pre>a  b\n  c…</pre>"),
+        ("<pre>a  b\n  cd</pre>", 4, "<pre>a  b…</pre>"),
+        ("<p>a&nbsp;&nbsp;b &amp; c</p>", 100, "<p>a\N{NO-BREAK SPACE}\N{NO-BREAK SPACE}b &amp; c</p>"),
+    ],
+)
+def test_excerpt(src, chars, expected):
+    assert html.excerpt(src, chars) == expected
+
+
+@pytest.mark.parametrize(
+    ("src", "expected"),
+    [
+        ("<p>Hello,\n    <b>world</b>!</p>\n", "<p>Hello, <b>world</b>!</p> "),
+        ("<p>One</p><p>Two</p><div>x</div>", "<p>One<p>Two<div>x</div>"),
+        ("<p>One</p>text", "<p>One</p>text"),
+        ("<a><p>One</p></a>", "<a><p>One</p></a>"),
+        ("<ul>\n  <li>One</li>\n  <li>Two</li>\n</ul>", "<ul><li>One<li>Two</ul>"),
+        ("<dl><dt>A</dt><dd>B</dd></dl>", "<dl><dt>A<dd>B</dl>"),
+        ("<table> <tr> <td>1</td> <td>2</td> </tr> </table>", "<table><tr><td>1<td>2</table>"),
+        (
+            "<pre>  keep\n  this  </pre><textarea>  and\n this</textarea>",
+            "<pre>  keep\n  this  </pre><textarea>  and\n this</textarea>",
+        ),
+        ('<a href="/x" title="two words" class="">x</a>', '<a href=/x title="two words" class>x</a>'),
+        ('<input value="a=b"><input value="it\'s">', '<input value="a=b"><input value="it&#x27;s">'),
+        ("<li>Orphan</li>", "<li>Orphan"),
+        ("<p>a&nbsp;&nbsp;b</p>", "<p>a\N{NO-BREAK SPACE}\N{NO-BREAK SPACE}b"),
+        ("<table><tr><td>1</td>&nbsp;</tr></table>", "<table><tr><td>1</td>\N{NO-BREAK SPACE}</table>"),
+    ],
+)
+def test_minified_serialisation(src, expected):
+    assert html.parse(src).serialize(minify=True).getvalue() == expected
+
+
+def test_minified_element_keeps_own_end_tag():
+    assert html.parse("<li>Orphan</li>")[0].serialize(minify=True).getvalue() == "<li>Orphan</li>"
+
+
+def test_make_minified():
+    assert html.make("a", attrs={"href": "/foo", "title": "a b", "download": ""}, minify=True) == (
+        '<a href=/foo title="a b" download></a>'
+    )
+
+
+def test_template():
+    tmpl = html.Template("a", ("href", "title", "download"))
+    assert tmpl.render("/x?a=1&b=2", "50% <off>", "") == html.make(
+        "a", {"href": "/x?a=1&b=2", "title": "50% <off>", "download": ""}
+    )
+    assert tmpl.render("/y", "Y", None) == '<a href="/y" title="Y" download></a>'
+    assert html.Template("img", ("src",)).render("/z.png") == '<img src="/z.png">'
+    assert html.Template("p", (), close=False).render() == "<p>"
+
+
+def test_template_render_many():
+    tmpl = html.Template("img", ("src", "alt"))
+    rows = [("/a.png", "A"), ("/b.png", None), ("/c.png", "C & D")]
+    assert tmpl.render_many(rows, sep="\n") == "\n".join(
+        html.make("img", dict(zip(("src", "alt"), row, strict=True))) for row in rows
+    )
+    with pytest.raises(TypeError):
+        tmpl.render("/a.png")
@@ -1,3 +1,5 @@
+import pytest
+
 from adjunct import jsonutils
 
 
@@ -15,3 +17,18 @@ def test_is_valid_json():
 
     results = list(jsonutils.load_json_documents(json_stream))
     assert results == expected_outputs
+
+
+def test_unpack_key():
+    assert jsonutils.unpack_key(["a", "b"], 1) == "b"
+    for index in (True, -1, 2, "0", None):
+        with pytest.raises(TypeError):
+            jsonutils.unpack_key(["a", "b"], index)
+    with pytest.raises(TypeError):
+        jsonutils.unpack_key([1], 0)
+
+
+def test_unpack_str():
+    assert jsonutils.unpack_str("x") == "x"
+    with pytest.raises(TypeError):
+        jsonutils.unpack_str(1)
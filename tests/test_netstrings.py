@@ -1,6 +1,21 @@
+import asyncio
+import io
+import random
+import tracemalloc
+
 import pytest
 
-from adjunct.netstrings import MalformedNetstringError, parse
+from adjunct.netstrings import (
+    MalformedNetstringError,
+    NetstringDecoder,
+    encode,
+    iter_netstrings,
+    netstring_reader,
+    netstring_views,
+    parse,
+    read_netstring,
+    write_netstring,
+)
 
 
 @pytest.mark.parametrize(
@@ -35,3 +50,269 @@ def test_good(data, expected):
 def test_malformed(data):
     with pytest.raises(MalformedNetstringError):
         parse(data)
+
+
+# The payloads of the well-formed streams the other readers are tested with.
+PAYLOADS = [[], [b""], [b"a"], [b"ab"], [b"abcdezxcvb"], [b"", b""], [b"a", b"a"], [b"ab", b"ab"]]
+GOOD = [(b"".join(map(encode, payloads)), payloads) for payloads in PAYLOADS]
+
+# Every reader treats a stream that ends partway through a length prefix, as
+# with b"12", as truncated.
+MALFORMED = [b"12345678901:b,", b"5:abcd,", b"0:", b"01:b,", b"a:b,", b"5:abcd", b"5:abcde", b"12", b"1:a,12"]
+
+
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 5, 8, 64])
+@pytest.mark.parametrize(("data", "expected"), GOOD)
+def test_good_buffer_sizes(data, expected, buffer_size):
+    assert list(netstring_reader(io.BytesIO(data), buffer_size)) == expected
+
+
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 5, 8, 64])
+@pytest.mark.parametrize("data", MALFORMED)
+def test_malformed_buffer_sizes(data, buffer_size):
+    with pytest.raises(MalformedNetstringError):
+        list(netstring_reader(io.BytesIO(data), buffer_size))
+
+
+def test_views():
+    data = b"3:abc,100000:" + b"x" * 100000 + b",0:,"
+    views = netstring_views(io.BytesIO(data), 16)
+    view = next(views)
+    assert isinstance(view, memoryview)
+    assert view == b"abc"
+    assert len(next(views)) == 100000
+    assert next(views) == b""
+    assert next(views, None) is None
+
+
+def test_views_bogus_length():
+    # The length alone mustn't be enough to make the reader allocate a buffer
+    # that big.
+    tracemalloc.start()
+    try:
+        with pytest.raises(MalformedNetstringError, match="too early"):
+            parse(b"200000000:ab,")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 1 << 20
+
+
+class _ReadOnly:
+    """A file-like object with only a `read()` method."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(min(size, 3))
+
+
+def test_views_read_only():
+    data = b"3:abc,100:" + b"x" * 100 + b",0:,"
+    assert list(netstring_reader(_ReadOnly(data), 16)) == [b"abc", b"x" * 100, b""]
+
+
+def _make_stream(rng, count, max_size):
+    payloads = [rng.randbytes(rng.randrange(max_size)) for _ in range(count)]
+    return payloads, b"".join(b"%d:%b," % (len(payload), payload) for payload in payloads)
+
+
+def test_random_payloads():
+    rng = random.Random(42)  # noqa: S311
+    payloads, data = _make_stream(rng, 500, 300)
+    for buffer_size in (7, 64, 256, 4096):
+        assert list(netstring_reader(io.BytesIO(data), buffer_size)) == payloads
+
+
+def _legacy_reader(fd):
+    """The original byte-at-a-time reader, for comparison."""
+    while True:
+        buffered = b""
+        while True:
+            ch = fd.read(1)
+            if ch == b"":
+                return
+            if ch == b":":
+                break
+            buffered += ch
+        size = int(buffered.decode(), 10)
+        payload = b""
+        while size > 0:
+            buffered = fd.read(size)
+            payload += buffered
+            size -= len(buffered)
+        fd.read(1)
+        yield payload
+
+
+class _SocketLike(io.RawIOBase):
+    """An unbuffered stream that, like a socket, returns short reads."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._data.readinto(memoryview(b)[:16384])
+
+
+@pytest.mark.slow
+def test_throughput_benchmark(best_of):
+    rng = random.Random(42)  # noqa: S311
+    _, small = _make_stream(rng, 20000, 200)
+    data = small + b"%d:%b," % (8 << 20, b"x" * (8 << 20))
+
+    def legacy():
+        for _ in _legacy_reader(_SocketLike(data)):
+            pass
+
+    def views():
+        for _ in netstring_views(_SocketLike(data)):
+            pass
+
+    assert list(netstring_reader(_SocketLike(data))) == list(_legacy_reader(io.BytesIO(data)))
+    best_of("views", views, repeat=3)
+    best_of("legacy", legacy, repeat=3)
+
+
+@pytest.mark.parametrize(("data", "expected"), GOOD)
+def test_decoder(data, expected):
+    decoder = NetstringDecoder()
+    assert decoder.feed(data) == expected
+    decoder.close()
+
+    # Byte at a time.
+    decoder = NetstringDecoder()
+    result = []
+    for i in range(len(data)):
+        result.extend(decoder.feed(data[i : i + 1]))
+    decoder.close()
+    assert result == expected
+
+
+@pytest.mark.parametrize("data", [*MALFORMED, b":a,", b"1a:b,"])
+def test_decoder_malformed(data):
+    decoder = NetstringDecoder()
+    with pytest.raises(MalformedNetstringError):
+        for i in range(len(data)):
+            decoder.feed(data[i : i + 1])
+        decoder.close()
+
+
+def test_decoder_random_chunks():
+    rng = random.Random(42)  # noqa: S311
+    payloads, data = _make_stream(rng, 200, 300)
+    decoder = NetstringDecoder()
+    result = []
+    pos = 0
+    while pos < len(data):
+        n = rng.randrange(1, 500)
+        result.extend(decoder.feed(memoryview(data)[pos : pos + n]))
+        pos += n
+    decoder.close()
+    assert result == payloads
+
+
+def test_decoder_max_size():
+    decoder = NetstringDecoder(max_size=5)
+    assert decoder.feed(b"5:hello,") == [b"hello"]
+    with pytest.raises(MalformedNetstringError, match="too large"):
+        decoder.feed(b"6:")
+
+    # The length is rejected before it's even complete.
+    decoder = NetstringDecoder(max_size=1000)
+    with pytest.raises(MalformedNetstringError, match="too large"):
+        decoder.feed(b"9999")
+
+
+def test_decoder_incomplete():
+    decoder = NetstringDecoder()
+    assert decoder.feed(b"5:abc") == []
+    with pytest.raises(MalformedNetstringError):
+        decoder.close()
+
+    decoder = NetstringDecoder()
+    assert decoder.feed(b"12") == []
+    with pytest.raises(MalformedNetstringError):
+        decoder.close()
+
+
+def _reader(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.parametrize(("data", "expected"), GOOD)
+def test_iter_netstrings(data, expected):
+    async def read_all():
+        return [payload async for payload in iter_netstrings(_reader(data))]
+
+    assert asyncio.run(read_all()) == expected
+
+
+@pytest.mark.parametrize("data", [*MALFORMED, b":a,"])
+def test_iter_netstrings_malformed(data):
+    async def read_all():
+        return [payload async for payload in iter_netstrings(_reader(data))]
+
+    with pytest.raises(MalformedNetstringError):
+        asyncio.run(read_all())
+
+
+def test_read_netstring():
+    async def read():
+        reader = _reader(b"5:hello,3:abc,")
+        assert await read_netstring(reader, max_size=5) == b"hello"
+        with pytest.raises(MalformedNetstringError, match="too large"):
+            await read_netstring(reader, max_size=2)
+
+    asyncio.run(read())
+
+
+def test_read_netstring_bounded_prefix():
+    async def read():
+        # No colon arrives before the stream's buffer limit is reached, and
+        # the stream stays open.
+        reader = asyncio.StreamReader(limit=16)
+        reader.feed_data(b"1" * 1000)
+        with pytest.raises(MalformedNetstringError, match="too long"):
+            await asyncio.wait_for(read_netstring(reader), 5)
+
+    asyncio.run(read())
+
+
+class _StubWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.drained = 0
+
+    def writelines(self, data):
+        for chunk in data:
+            self.buffer += chunk
+
+    async def drain(self):
+        self.drained += 1
+
+
+def test_write_netstring():
+    writer = _StubWriter()
+
+    async def write():
+        await write_netstring(writer, b"hello")
+        await write_netstring(writer, b"")
+
+    asyncio.run(write())
+    assert writer.buffer == b"5:hello,0:,"
+    assert writer.drained == 2
+    assert parse(bytes(writer.buffer)) == [b"hello", b""]
+
+
+def test_encode():
+    assert encode(b"") == b"0:,"
+    assert encode(b"hello") == b"5:hello,"
+    assert parse(encode(b"a" * 1000)) == [b"a" * 1000]
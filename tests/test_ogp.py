@@ -87,3 +87,34 @@ def test_bad_metadata_handling():
     assert parsed[0].metadata == {"lang": "en"}
     assert parsed[1].type_ == "description"
     assert parsed[1].metadata == {}
+
+
+def test_pack_round_trip(ogp_properties):
+    _, parsed = ogp_properties
+    packed = ogp.pack(parsed)
+    assert isinstance(packed, bytes)
+    assert ogp.unpack(packed) == parsed
+
+
+def test_unpack_rejects_bad_data():
+    with pytest.raises(ValueError, match="version"):
+        ogp.unpack(b"[0,[],[]]")
+    with pytest.raises(ValueError, match="Malformed"):
+        ogp.unpack(b"not json")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"[1,[],7]",
+        b'[1,["title"],[[5,"x"]]]',
+        b'[1,["title"],[[-1,"x"]]]',
+        b'[1,["title"],[[true,"x"]]]',
+        b'[1,["title"],[[0,7]]]',
+        b'[1,["title"],[[0,"x",0]]]',
+        b'[1,["title"],[7]]',
+    ],
+)
+def test_unpack_rejects_malformed_contents(data):
+    with pytest.raises(ValueError, match="Malformed"):
+        ogp.unpack(data)
@@ -1,5 +1,12 @@
 import datetime
+import email.utils
+import io
+import json
+import mmap
 import os.path
+import sys
+import xml.sax
+import xml.sax.handler
 
 import pytest
 
@@ -45,3 +52,415 @@ def test_date_parse():
     # Note: the resulting date is in UTC.
     expected = datetime.datetime(1997, 11, 21, 15, 55, 6, tzinfo=datetime.UTC)
     assert opml.parse_timestamp("Fri, 21 Nov 1997 09:55:06 -0600") == expected
+
+
+def _email_timestamp(ts):
+    tt = email.utils.parsedate_tz(ts)
+    if tt is None:
+        return None
+    return datetime.datetime.fromtimestamp(email.utils.mktime_tz(tt), tz=datetime.UTC)
+
+
+@pytest.mark.parametrize(
+    "ts",
+    [
+        "Fri, 21 Nov 1997 09:55:06 -0600",
+        "21 Nov 1997 09:55:06 +0530",
+        "Sat, 01 Jan 2000 00:00:00 +0000",
+        "Mon, 1 Mar 2004 23:59:59 -1200",
+        # These fall back to email.utils.
+        "Fri, 21 Nov 1997 09:55:06 GMT",
+        "Fri, 21 Nov 97 09:55:06 EST",
+        "Fri, 21 Nov 1997 09:55 -0600",
+        "Sat, 31 Dec 2016 23:59:60 +0000",
+        "Fri, 21 Nov 1997 09:55:06 -0000",
+        "Fri, 31 Feb 1997 09:55:06 -0600",
+        "not a timestamp",
+        "",
+    ],
+)
+def test_date_parse_matches_email_utils(ts):
+    assert opml.parse_timestamp(ts) == _email_timestamp(ts)
+
+
+def test_parse_timestamps():
+    timestamps = ["Fri, 21 Nov 1997 09:55:06 -0600", "garbage", "Fri, 21 Nov 1997 09:55:06 -0600"]
+    expected = datetime.datetime(1997, 11, 21, 15, 55, 6, tzinfo=datetime.UTC)
+    assert list(opml.parse_timestamps(timestamps)) == [expected, None, expected]
+    assert list(opml.parse_timestamps(timestamps, epoch=True)) == [expected.timestamp(), None, expected.timestamp()]
+
+
+@pytest.mark.slow
+def test_date_parse_benchmark(best_of):
+    timestamps = [f"Fri, {day:02} Nov 1997 09:55:{second:02} -0600" for day in range(1, 29) for second in range(60)]
+
+    def fast():
+        opml.parse_timestamp.cache_clear()
+        for ts in timestamps:
+            opml.parse_timestamp(ts)
+
+    def slow():
+        for ts in timestamps:
+            _email_timestamp(ts)
+
+    assert [opml.parse_timestamp(ts) for ts in timestamps] == [_email_timestamp(ts) for ts in timestamps]
+    best_of("parse_timestamp", fast)
+    best_of("email.utils", slow)
+
+
+def test_iterparse():
+    with open(os.path.join(HERE, "sample.opml"), "rb") as fh:
+        outlines = opml.iterparse(fh, chunk_size=16)
+        assert outlines.head == {"title": "Sample OPML file"}
+        found = [(depth, path, attrs["text"]) for depth, path, attrs in outlines]
+    assert found == [
+        (0, (), "News"),
+        (1, ("News",), "Euronews"),
+        (1, ("News",), "Reuters Top News"),
+        (0, (), "Tech"),
+        (1, ("Tech",), "Coding Horror"),
+        (0, (), "Personal"),
+        (1, ("Personal",), "Can't Hack"),
+    ]
+
+
+def test_iterparse_matches_parse():
+    with open(os.path.join(HERE, "sample.opml")) as fh:
+        doc = opml.parse(fh)
+    with open(os.path.join(HERE, "sample.opml")) as fh:
+        streamed = [attrs for _, _, attrs in opml.iterparse(fh)]
+    assert streamed == [
+        doc[0].attrs,
+        *(o.attrs for o in doc[0]),
+        doc[1].attrs,
+        doc[1][0].attrs,
+        doc[2].attrs,
+        doc[2][0].attrs,
+    ]
+
+
+def test_iterparse_exception():
+    fh = io.BytesIO(b'<?xml version="1.0" encoding="UTF-8"?><opml version="1.0"><body><outline/><head/></body></opml>')
+    with pytest.raises(opml.OpmlError, match="Got <head>, expected <outline>"):
+        list(opml.iterparse(fh))
+
+
+def test_malformed():
+    with pytest.raises(opml.OpmlError, match="Malformed document"):
+        opml.parse_string("<opml><head></opml>")
+
+
+def _attrs(outline):
+    """Flatten an outline tree into its attributes, which `==` doesn't compare."""
+    return [dict(outline.attrs), [_attrs(child) for child in outline]]
+
+
+def test_parse_binary_and_mmap():
+    with open(os.path.join(HERE, "sample.opml")) as fh:
+        expected = _attrs(opml.parse(fh))
+    with open(os.path.join(HERE, "sample.opml"), "rb") as fh:
+        assert _attrs(opml.parse(fh)) == expected
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert _attrs(opml.parse_string(mapped)) == expected
+    with open(os.path.join(HERE, "sample.opml"), "rb") as fh:
+        assert _attrs(opml.parse_string(fh.read())) == expected
+
+
+def test_head_text_is_buffered():
+    doc = opml.parse_string(
+        '<opml version="2.0"><head><title> Fish &amp; Chips </title></head><body/></opml>',
+    )
+    assert doc is not None
+    assert doc.attrs == {"title": "Fish & Chips"}
+
+
+class _SaxHandler(xml.sax.handler.ContentHandler):
+    """The xml.sax-based tree builder that preceded the expat one, for comparison."""
+
+    def startDocument(self):  # noqa: N802
+        self.root = opml.Outline(root=True)
+        self.stack = [self.root]
+        self.tags = []
+
+    def startElement(self, name, attrs):  # noqa: N802
+        expected = {
+            None: ["opml"],
+            "opml": ["head", "body"],
+            "head": ["title"],
+            "body": ["outline"],
+            "outline": ["outline"],
+        }
+        if name not in expected[self.tags[-1] if self.tags else None]:
+            raise opml.OpmlError(name)
+        self.tags.append(name)
+        if name == "outline":
+            outline = opml.Outline()
+            self.stack[-1].append(outline)
+            self.stack.append(outline)
+            outline.attrs = dict(attrs.items())
+            for attr in ("isComment", "isBreakpoint"):
+                outline.attrs.setdefault(attr, "false")
+
+    def endElement(self, name):  # noqa: N802
+        self.tags.pop()
+        if name == "outline":
+            self.stack.pop()
+
+    def characters(self, content):
+        content = content.strip()
+        if content != "" and self.tags[-1] == "title":
+            self.root.attrs["title"] = content
+
+
+@pytest.mark.slow
+def test_parse_benchmark(best_of):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<opml version="2.0"><head><title>Big</title></head><body>']
+    for i in range(700):
+        parts.append(f'<outline text="Folder {i}">')
+        parts.extend(
+            f'<outline text="Feed {i}-{j}" type="rss" xmlUrl="http://example.com/{i}/{j}/feed.xml" htmlUrl="http://example.com/{i}/{j}/"/>\n'
+            for j in range(120)
+        )
+        parts.append("</outline>")
+    parts.append("</body></opml>")
+    data = "".join(parts).encode("utf-8")
+    assert len(data) > 10_000_000
+
+    doc = opml.parse(io.BytesIO(data))
+    assert doc is not None
+    assert len(doc) == 700
+    assert sum(len(folder) for folder in doc) == 700 * 120
+
+    best_of("expat", lambda: opml.parse(io.BytesIO(data)), repeat=3)
+    best_of("xml.sax", lambda: xml.sax.parse(io.BytesIO(data), _SaxHandler()), repeat=3)
+
+
+def test_outline_attrs():
+    doc = opml.parse_string('<opml><body><outline text="Feed" isComment="true"/></body></opml>')
+    assert doc is not None
+    outline = doc[0]
+    assert not hasattr(outline, "__dict__")
+    assert outline.attrs is outline.attrs
+    assert outline.attrs == {"text": "Feed", "isComment": "true", "isBreakpoint": "false"}
+    outline.attrs["isBreakpoint"] = "true"
+    assert outline.attrs["isBreakpoint"] == "true"
+    del outline.attrs["isBreakpoint"]
+    assert outline.attrs["isBreakpoint"] == "false"
+    # Deleting an attribute that's only present as a default is a no-op.
+    del outline.attrs["isBreakpoint"]
+    assert "isBreakpoint" in outline.attrs
+    with pytest.raises(KeyError):
+        del outline.attrs["title"]
+
+    # They're still dicts, with the defaults visible as usual.
+    expected = {"text": "Feed", "isComment": "true", "isBreakpoint": "false"}
+    assert isinstance(outline.attrs, dict)
+    assert json.loads(json.dumps(outline.attrs)) == expected
+    assert outline.attrs | {"title": "T"} == {**expected, "title": "T"}
+    assert dict(outline.attrs) == expected
+    assert outline.attrs.get("isBreakpoint") == "false"
+
+    # Outlines that weren't parsed have only the attributes they're given.
+    attrs = {"text": "Other"}
+    other = opml.Outline(attrs)
+    assert other.attrs is attrs
+    assert opml.Outline().attrs == {}
+
+    root = opml.Outline({"title": "Doc"}, [outline], root=True)
+    assert root.attrs == {"title": "Doc"}
+    assert root[0] is outline
+
+
+def test_parsed_outlines_share_names():
+    doc = opml.parse_string('<opml><body><outline text="a"/><outline text="b"/></body></opml>')
+    doc2 = opml.parse_string('<opml><body><outline text="c"/></body></opml>')
+    assert doc is not None
+    assert doc2 is not None
+    names = [next(iter(outline.attrs)) for outline in (*doc, *doc2)]
+    assert names[0] is names[1] is names[2]
+
+
+def _flatten(outline):
+    return [(dict(child.attrs), _flatten(child)) for child in outline]
+
+
+def test_write_round_trip():
+    with open(os.path.join(HERE, "sample.opml")) as fh:
+        doc = opml.parse(fh)
+    buf = io.BytesIO()
+    opml.write(doc, buf)
+    written = opml.parse_string(buf.getvalue())
+    assert written is not None
+    assert written.attrs == doc.attrs
+    assert _flatten(written) == _flatten(doc)
+
+
+def test_write_generator():
+    def generate():
+        for i in range(3):
+            yield opml.Outline({"text": f'Feed <{i}> & "co"', "xmlUrl": f"http://example.com/{i}?a=1&b=2"})
+
+    created = datetime.datetime(1997, 11, 21, 15, 55, 6, tzinfo=datetime.UTC)
+    buf = io.StringIO()
+    opml.write(generate(), buf, head={"title": "Generated", "dateCreated": created})
+    assert "<dateCreated>Fri, 21 Nov 1997 15:55:06 +0000</dateCreated>" in buf.getvalue()
+    doc = opml.parse_string(buf.getvalue())
+    assert doc is not None
+    assert opml.parse_timestamp(doc.attrs["dateCreated"]) == created
+    assert [outline.attrs["text"] for outline in doc] == [f'Feed <{i}> & "co"' for i in range(3)]
+    assert doc[2].attrs["xmlUrl"] == "http://example.com/2?a=1&b=2"
+
+
+def test_write_single_outline():
+    buf = io.StringIO()
+    opml.write(opml.Outline({"text": "Feed", "xmlUrl": "http://example.com/"}), buf)
+    doc = opml.parse_string(buf.getvalue())
+    assert doc is not None
+    assert _flatten(doc) == [({"text": "Feed", "xmlUrl": "http://example.com/", **opml._OUTLINE_DEFAULTS}, [])]
+
+
+def test_write_deeply_nested():
+    depth = sys.getrecursionlimit() * 2
+    outline = root = opml.Outline(root=True)
+    for i in range(depth):
+        outline.append(opml.Outline({"text": str(i)}))
+        outline = outline[0]
+    buf = io.StringIO()
+    opml.write(root, buf)
+    written = opml.parse_string(buf.getvalue())
+    assert written is not None
+    for i in range(depth):
+        (written,) = written
+        assert written.attrs["text"] == str(i)
+    assert len(written) == 0
+
+
+OLD_SUBSCRIPTIONS = """<opml version="2.0"><body>
+<outline text="News">
+  <outline text="Euronews" xmlUrl="http://feeds.example.com/euronews"/>
+  <outline text="Reuters" xmlUrl="HTTP://Feeds.Example.com:80/reuters"/>
+</outline>
+<outline text="Tech">
+  <outline text="Coding Horror" xmlUrl="https://feeds.example.com/codinghorror"/>
+</outline>
+<outline text="Blog" htmlUrl="https://blog.example.com"/>
+</body></opml>"""
+
+NEW_SUBSCRIPTIONS = """<opml version="2.0"><body>
+<outline text="News">
+  <outline text="Reuters" xmlUrl="http://feeds.example.com/reuters#top"/>
+  <outline text="Coding Horror" xmlUrl="https://feeds.example.com/codinghorror"/>
+</outline>
+<outline text="Tech">
+  <outline text="Programming">
+    <outline text="LWN" xmlUrl="https://lwn.net/headlines/rss"/>
+  </outline>
+</outline>
+<outline text="Blog" htmlUrl="https://blog.example.com/"/>
+</body></opml>"""
+
+
+def test_index_feeds():
+    doc = opml.parse_string(OLD_SUBSCRIPTIONS)
+    index = opml.index_feeds(doc)
+    assert list(index) == [
+        "http://feeds.example.com/euronews",
+        "http://feeds.example.com/reuters",
+        "https://feeds.example.com/codinghorror",
+        "https://blog.example.com/",
+    ]
+    path, outline = index["https://feeds.example.com/codinghorror"]
+    assert path == ("Tech",)
+    assert outline.attrs["text"] == "Coding Horror"
+
+
+def test_index_feeds_skips_empty_urls():
+    doc = opml.parse_string(
+        '<opml><body><outline text="A" xmlUrl="" htmlUrl=""/><outline text="B" htmlUrl=" "/>'
+        '<outline text="C" xmlUrl="" htmlUrl="http://example.com/"/></body></opml>',
+    )
+    assert doc is not None
+    index = opml.index_feeds(doc)
+    assert list(index) == ["http://example.com/"]
+    assert index["http://example.com/"][1].attrs["text"] == "C"
+
+
+def test_diff():
+    changes = opml.diff(opml.parse_string(OLD_SUBSCRIPTIONS), opml.parse_string(NEW_SUBSCRIPTIONS))
+    assert [(path, outline.attrs["text"]) for path, outline in changes.added] == [(("Tech", "Programming"), "LWN")]
+    assert [(path, outline.attrs["text"]) for path, outline in changes.removed] == [(("News",), "Euronews")]
+    assert [(old, new, outline.attrs["text"]) for old, new, outline in changes.moved] == [
+        (("Tech",), ("News",), "Coding Horror"),
+    ]
+
+
+def test_merge():
+    old = opml.parse_string(OLD_SUBSCRIPTIONS)
+    new = opml.parse_string(NEW_SUBSCRIPTIONS)
+    merged = opml.merge(old, new)
+    assert merged.root
+    # The original is left alone.
+    assert len(old[1]) == 1
+    assert [outline.attrs["text"] for outline in merged] == ["News", "Tech", "Blog"]
+    assert [outline.attrs["text"] for outline in merged[1]] == ["Coding Horror", "Programming"]
+    assert merged[1][1][0].attrs["xmlUrl"] == "https://lwn.net/headlines/rss"
+    assert not opml.diff(new, merged).removed
+    assert not opml.diff(merged, old).added
+
+
+def test_merge_deep_nesting():
+    depth = 5000
+    doc = opml.parse_string("<opml><body>" + '<outline text="x">' * depth + "</outline>" * depth + "</body></opml>")
+    assert doc is not None
+    merged = opml.merge(doc, opml.Outline(root=True))
+    for _ in range(depth):
+        assert len(merged) == 1
+        merged = merged[0]
+    assert len(merged) == 0
+
+
+def test_parse_many(tmp_path):
+    good = tmp_path / "good.opml"
+    good.write_text(NEW_SUBSCRIPTIONS)
+    bad = tmp_path / "bad.opml"
+    bad.write_text("<opml version='2.0'><body><outline>")
+    missing = tmp_path / "missing.opml"
+
+    results = list(opml.parse_many([good, bad, missing, good], workers=2, chunksize=1))
+    assert [result.path for result in results] == [str(good), str(bad), str(missing), str(good)]
+
+    assert results[0].error is None
+    assert results[0] == results[3]
+    assert [row[:2] for row in results[0].rows] == [
+        (0, ()),
+        (1, ("News",)),
+        (1, ("News",)),
+        (0, ()),
+        (1, ("Tech",)),
+        (2, ("Tech", "Programming")),
+        (0, ()),
+    ]
+    assert results[0].rows[5][2] == {"text": "LWN", "xmlUrl": "https://lwn.net/headlines/rss"}
+    # Siblings share their path rather than each pickling a copy.
+    assert results[0].rows[1][1] is results[0].rows[2][1]
+
+    assert results[1].error is not None
+    assert results[1].error.startswith("Malformed document")
+    assert results[1].rows == []
+    assert results[2].error is not None
+
+
+def test_parse_many_closed_early(tmp_path):
+    good = tmp_path / "good.opml"
+    good.write_text(NEW_SUBSCRIPTIONS)
+    results = opml.parse_many([good] * 50, workers=1, chunksize=1)
+    assert next(results).error is None
+    results.close()
+
+
+def test_iterparse_shares_paths():
+    with open(os.path.join(HERE, "sample.opml"), "rb") as fh:
+        rows = list(opml.iterparse(fh))
+    by_path = {}
+    for _, path, _ in rows:
+        assert by_path.setdefault(path, path) is path
@@ -1,6 +1,9 @@
+import codecs
 import io
 
-from adjunct.xmlutils import XMLBuilder
+import pytest
+
+from adjunct.xmlutils import RecordTemplate, Slot, XMLBuilder, stream
 
 
 def test_basics():
@@ -45,3 +48,201 @@ def test_attrs():
 <root xmlns="myns"></root>"""
     )
     xml.close()
+
+
+def _build(xml):
+    with xml.within("feed", xmlns="http://www.w3.org/2005/Atom"):
+        xml.title("Tom & Jerry <3")
+        xml.link(href="http://example.com/?a=1&b=2", rel="alternate")
+        for value in ['say "hi"', "it's", '"it\'s"', "line\nbreak\ttab\r"]:
+            xml.tag("category", term=value)
+        with xml.within("entry"):
+            xml += "a > b"
+            xml.tag("empty")
+    xml.close()
+
+
+def test_direct_matches_sax():
+    sax_buf = io.StringIO()
+    _build(XMLBuilder(sax_buf))
+    direct_buf = io.StringIO()
+    _build(XMLBuilder(direct_buf, direct=True))
+    assert direct_buf.getvalue() == sax_buf.getvalue()
+
+
+def test_direct_buffers_output():
+    buf = io.StringIO()
+    xml = XMLBuilder(buf, direct=True)
+    xml.root("Body")
+    assert buf.getvalue() == ""
+    xml.flush()
+    assert buf.getvalue() == """<?xml version="1.0" encoding="utf-8"?>\n<root>Body</root>"""
+
+    xml = XMLBuilder(direct=True)
+    xml.root("Body")
+    assert xml.as_string() == """<?xml version="1.0" encoding="utf-8"?>\n<root>Body</root>"""
+    xml.close()
+
+
+def test_tag_methods_are_cached():
+    xml = XMLBuilder()
+    assert xml.entry is xml.entry
+    xml.close()
+
+
+@pytest.mark.slow
+def test_direct_benchmark(best_of):
+    def build(direct):
+        xml = XMLBuilder(direct=direct)
+        with xml.within("feed"):
+            for i in range(5000):
+                with xml.within("entry"):
+                    xml.title(f"Entry {i} & more")
+                    xml.link(href=f"http://example.com/{i}?a=1&b=2")
+                    xml.updated("2024-01-01T00:00:00Z")
+        result = xml.as_string()
+        xml.close()
+        return result
+
+    assert build(direct=True) == build(direct=False)
+    best_of("direct", lambda: build(direct=True))
+    best_of("buffered", lambda: build(direct=False))
+
+
+def test_direct_binary_sink():
+    buf = io.BytesIO()
+    xml = XMLBuilder(buf, "iso-8859-1", direct=True, flush_threshold=16)
+    with xml.within("root"):
+        xml.name("Ciarán")
+        xml.name("Ωmega")
+    # Most of the document has been flushed already.
+    assert buf.getvalue().startswith(b'<?xml version="1.0" encoding="iso-8859-1"?>\n<root>')
+    xml.close()
+    assert buf.getvalue() == (
+        b'<?xml version="1.0" encoding="iso-8859-1"?>\n<root><name>Ciar\xe1n</name><name>&#937;mega</name></root>'
+    )
+
+
+def test_direct_utf16_has_one_bom():
+    def build(xml):
+        with xml.within("root"):
+            for i in range(20):
+                xml.item(f"Item {i}")
+                yield
+
+    doc = b"".join(stream(build, "utf-16", flush_threshold=16))
+    assert doc.count(codecs.BOM_UTF16) == 1
+    assert doc.decode("utf-16").endswith("<item>Item 19</item></root>")
+
+
+def test_direct_duck_typed_sinks():
+    class TextSink:
+        def __init__(self):
+            self.parts = []
+
+        def write(self, data):
+            if not isinstance(data, str):
+                raise TypeError("text only")
+            self.parts.append(data)
+
+    class BinarySink(TextSink):
+        def write(self, data):
+            if not isinstance(data, bytes):
+                raise TypeError("bytes only")
+            self.parts.append(data)
+
+    for sink, join in [(TextSink(), "".join), (BinarySink(), lambda parts: b"".join(parts).decode())]:
+        xml = XMLBuilder(sink, direct=True, flush_threshold=16)
+        with xml.within("root"):
+            xml.name("Ciarán")
+        xml.close()
+        assert join(sink.parts) == '<?xml version="1.0" encoding="utf-8"?>\n<root><name>Ciarán</name></root>'
+
+
+def test_stream():
+    def build(xml):
+        with xml.within("urlset"):
+            for i in range(100):
+                xml.loc(f"http://example.com/{i}")
+                yield
+
+    chunks = list(stream(build, flush_threshold=256))
+    assert len(chunks) > 1
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    doc = b"".join(chunks)
+    assert doc.startswith(b'<?xml version="1.0" encoding="utf-8"?>\n<urlset><loc>http://example.com/0</loc>')
+    assert doc.endswith(b"<loc>http://example.com/99</loc></urlset>")
+
+
+def test_stream_plain_function():
+    def build(xml):
+        xml.root("Body")
+
+    assert b"".join(stream(build)) == b'<?xml version="1.0" encoding="utf-8"?>\n<root>Body</root>'
+
+
+ENTRY = RecordTemplate(
+    "entry",
+    RecordTemplate("title", Slot("title")),
+    RecordTemplate("link", href=Slot("link"), rel="alternate"),
+    RecordTemplate("summary", "100% ", Slot("summary")),
+)
+
+ENTRY_ROWS = [
+    {"title": "Tom & Jerry", "link": 'http://example.com/?a=1&b="2"', "summary": "<b>bold</b>"},
+    {"title": "%s %(x)s", "link": "http://example.com/\n", "summary": None},
+    {"title": 42, "link": "it's", "summary": 3.5},
+]
+
+
+def _build_entries(xml):
+    for row in ENTRY_ROWS:
+        with xml.within("entry"):
+            xml.title("" if row["title"] is None else str(row["title"]))
+            xml.link(href=row["link"], rel="alternate")
+            xml.summary("100% ", "" if row["summary"] is None else str(row["summary"]))
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_emit_many(direct):
+    expected = XMLBuilder(direct=direct)
+    with expected.within("feed"):
+        _build_entries(expected)
+
+    xml = XMLBuilder(direct=direct)
+    with xml.within("feed"):
+        xml.emit_many(ENTRY, ENTRY_ROWS)
+    assert xml.as_string() == expected.as_string()
+
+
+def test_record_template_positional_slots():
+    template = RecordTemplate("url", RecordTemplate("loc", Slot(0)), priority=Slot(1))
+    assert template.render(("http://example.com/", 0.5)) == '<url priority="0.5"><loc>http://example.com/</loc></url>'
+
+
+@pytest.mark.slow
+def test_emit_many_benchmark(best_of):
+    rows = [
+        {"title": f"Entry {i} & more", "link": f"http://example.com/{i}?a=1&b=2", "summary": "Lorem ipsum"}
+        for i in range(5000)
+    ]
+
+    def with_tags():
+        xml = XMLBuilder(direct=True)
+        with xml.within("feed"):
+            for row in rows:
+                with xml.within("entry"):
+                    xml.title(row["title"])
+                    xml.link(href=row["link"], rel="alternate")
+                    xml.summary("100% ", row["summary"])
+        return xml.as_string()
+
+    def with_template():
+        xml = XMLBuilder(direct=True)
+        with xml.within("feed"):
+            xml.emit_many(ENTRY, rows)
+        return xml.as_string()
+
+    assert with_template() == with_tags()
+    best_of("emit_many", with_template)
+    best_of("tags", with_tags)